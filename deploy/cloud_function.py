@@ -9,15 +9,26 @@ This module provides a Google Cloud Function entrypoint for the FormatNormalizer
 It handles incoming HTTP requests and forwards them to the normalizer.
 """
 
+import io
 import os
 import json
 import logging
 import asyncio
+import shutil
 import tempfile
+import threading
+from functools import lru_cache
+from typing import Optional, Union
 import functions_framework
-from flask import Request, jsonify
-from werkzeug.utils import secure_filename
+import msgspec
+from flask import Request, Response
 import google.cloud.storage as storage
+from google.cloud.storage import transfer_manager
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Import the normalizer
 import sys
@@ -31,16 +42,90 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize the normalizer
-normalizer = FormatNormalizer()
+@lru_cache(maxsize=None)
+def get_normalizer() -> FormatNormalizer:
+    """Create the normalizer on first use so cold starts stay cheap."""
+    return FormatNormalizer()
+
+@lru_cache(maxsize=None)
+def get_storage_client() -> storage.Client:
+    """Create the GCS client on first upload so health checks skip credential lookup."""
+    return storage.Client()
 
-# Initialize GCS client
-storage_client = storage.Client()
+# Persistent event loop shared by all invocations in this instance so async
+# clients and warm state survive between requests
+LOOP = asyncio.new_event_loop()
+threading.Thread(target=LOOP.run_forever, name="normalizer-loop", daemon=True).start()
+
+def run_async(coro):
+    """
+    Run a coroutine on the persistent event loop and wait for its result.
+    
+    Args:
+        coro: Coroutine to execute
+        
+    Returns:
+        The coroutine's result
+    """
+    return asyncio.run_coroutine_threadsafe(coro, LOOP).result()
 
 # Get configuration from environment
 OUTPUT_BUCKET = os.environ.get('OUTPUT_BUCKET', 'format-normalizer-output')
 TEMP_DIR = os.environ.get('TEMP_DIR', '/tmp')
 
+# Resumable upload tuning. GCS requires the chunk size to be a multiple of 256 KiB.
+GCS_CHUNK_ALIGNMENT = 256 * 1024
+GCS_CHUNK_SIZE = max(
+    GCS_CHUNK_ALIGNMENT,
+    int(os.environ.get('GCS_CHUNK_SIZE', 16 * 1024 * 1024)) // GCS_CHUNK_ALIGNMENT * GCS_CHUNK_ALIGNMENT
+)
+GCS_UPLOAD_TIMEOUT = float(os.environ.get('GCS_UPLOAD_TIMEOUT', 300))
+
+# Buffer size used when streaming request bodies to disk
+UPLOAD_BUFFER_SIZE = 1024 * 1024
+
+# Parallel upload tuning. Outputs at or above the threshold are sent as
+# concurrently uploaded chunks of a single multipart upload.
+GCS_PARALLEL_THRESHOLD = int(os.environ.get('GCS_PARALLEL_THRESHOLD', 150 * 1024 * 1024))
+GCS_PARALLEL_WORKERS = int(os.environ.get('GCS_PARALLEL_WORKERS', 8))
+
+class NormalizeSource(msgspec.Struct):
+    """Source section of a JSON normalization request."""
+    uri: Optional[str] = None
+
+class NormalizeTarget(msgspec.Struct):
+    """Target section of a JSON normalization request."""
+    format: Optional[str] = None
+    codec: Optional[str] = None
+    preset: Optional[str] = None
+
+class NormalizeOptions(msgspec.Struct, rename="camel"):
+    """Options section of a JSON normalization request."""
+    preserve_metadata: bool = True
+    enable_ai: bool = False
+    validate_output: bool = True
+
+class NormalizeRequest(msgspec.Struct):
+    """JSON normalization request body, decoded directly from the raw payload."""
+    source: NormalizeSource = msgspec.field(default_factory=NormalizeSource)
+    target: NormalizeTarget = msgspec.field(default_factory=NormalizeTarget)
+    options: NormalizeOptions = msgspec.field(default_factory=NormalizeOptions)
+
+def json_response(payload, status: int = 200) -> Response:
+    """
+    Serialize a payload into a JSON HTTP response.
+    
+    Args:
+        payload: JSON-serializable response body
+        status: HTTP status code
+        
+    Returns:
+        Flask response object
+    """
+    if orjson is not None:
+        return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+    return Response(json.dumps(payload), status=status, mimetype='application/json')
+
 @functions_framework.http
 def normalize_http(request: Request):
     """
@@ -55,7 +140,7 @@ def normalize_http(request: Request):
     try:
         # Determine the request type
         if request.method == 'GET':
-            return jsonify({
+            return json_response({
                 "status": "ok",
                 "service": "FormatNormalizer",
                 "version": "1.0.0"
@@ -71,15 +156,15 @@ def normalize_http(request: Request):
                 return handle_json_request(request)
         
         else:
-            return jsonify({
+            return json_response({
                 "error": "Method not allowed"
-            }), 405
+            }, 405)
     
     except Exception as e:
         logger.error(f"Error handling request: {e}")
-        return jsonify({
+        return json_response({
             "error": str(e)
-        }), 500
+        }, 500)
 
 def handle_file_upload(request: Request):
     """
@@ -93,21 +178,23 @@ def handle_file_upload(request: Request):
     """
     # Check if the post request has the file part
     if 'file' not in request.files:
-        return jsonify({"error": "No file provided"}), 400
+        return json_response({"error": "No file provided"}, 400)
     
     file = request.files['file']
     
     # If the user does not select a file, browser submits an empty part
     if file.filename == '':
-        return jsonify({"error": "No file selected"}), 400
+        return json_response({"error": "No file selected"}, 400)
     
     try:
-        # Create temporary directory for the uploaded file
-        temp_dir = tempfile.mkdtemp(dir=TEMP_DIR)
+        # Create a uniquely named temporary file, keeping only the extension
+        # of the client-supplied name so nothing else of it reaches the path
+        ext = os.path.splitext(file.filename)[1][:8]
+        fd, file_path = tempfile.mkstemp(dir=TEMP_DIR, suffix=ext)
         
-        # Save the uploaded file
-        file_path = os.path.join(temp_dir, secure_filename(file.filename))
-        file.save(file_path)
+        # Stream the uploaded file to disk in bounded chunks
+        with os.fdopen(fd, 'wb') as out:
+            shutil.copyfileobj(file.stream, out, length=UPLOAD_BUFFER_SIZE)
         
         # Extract parameters from form data
         target_format = request.form.get('format')
@@ -118,8 +205,8 @@ def handle_file_upload(request: Request):
         validate_output = request.form.get('validate_output', 'true').lower() == 'true'
         
         # Process the normalization
-        result = asyncio.run(
-            normalizer.normalize(
+        result = run_async(
+            get_normalizer().normalize(
                 source=file_path,
                 target_format=target_format,
                 codec=codec,
@@ -128,25 +215,32 @@ def handle_file_upload(request: Request):
                     "preserveMetadata": preserve_metadata,
                     "enableAI": enable_ai,
                     "validateOutput": validate_output
-                }
+                },
+                return_bytes=True
             )
         )
         
         # If normalization was successful, upload the result to GCS
         if result.get("success", False):
             output_path = result.get("result", {}).get("uri")
-            if output_path and os.path.exists(output_path):
+            data = result.pop("data", None)
+            if data is not None:
+                # Small outputs come back in memory and skip the disk round trip
+                result["result"]["gcs_uri"] = upload_to_gcs(
+                    data, OUTPUT_BUCKET, result["result"]["filename"]
+                )
+            elif output_path and os.path.exists(output_path):
                 # Upload to GCS
                 gcs_path = upload_to_gcs(output_path, OUTPUT_BUCKET)
                 
                 # Update the result with GCS path
                 result["result"]["gcs_uri"] = gcs_path
         
-        return jsonify(result)
+        return json_response(result)
     
     except Exception as e:
         logger.error(f"Error processing file: {e}")
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 def handle_json_request(request: Request):
     """
@@ -159,72 +253,110 @@ def handle_json_request(request: Request):
         HTTP response
     """
     try:
-        # Parse JSON request
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({"error": "Invalid JSON"}), 400
+        # Decode the JSON request straight into typed structs
+        try:
+            data = msgspec.json.decode(request.get_data(), type=NormalizeRequest)
+        except msgspec.ValidationError as e:
+            return json_response({"error": f"Invalid request: {e}"}, 400)
+        except msgspec.DecodeError:
+            return json_response({"error": "Invalid JSON"}, 400)
         
         # Extract parameters
-        source_uri = data.get("source", {}).get("uri")
+        source_uri = data.source.uri
         if not source_uri:
-            return jsonify({"error": "Source URI is required"}), 400
+            return json_response({"error": "Source URI is required"}, 400)
         
-        target = data.get("target", {})
-        options = data.get("options", {})
+        target = data.target
+        options = data.options
         
         # Process the normalization
-        result = asyncio.run(
-            normalizer.normalize(
+        result = run_async(
+            get_normalizer().normalize(
                 source=source_uri,
-                target_format=target.get("format"),
-                codec=target.get("codec"),
-                preset=target.get("preset"),
+                target_format=target.format,
+                codec=target.codec,
+                preset=target.preset,
                 options={
-                    "preserveMetadata": options.get("preserveMetadata", True),
-                    "enableAI": options.get("enableAI", False),
-                    "validateOutput": options.get("validateOutput", True)
-                }
+                    "preserveMetadata": options.preserve_metadata,
+                    "enableAI": options.enable_ai,
+                    "validateOutput": options.validate_output
+                },
+                return_bytes=True
             )
         )
         
         # If normalization was successful, upload the result to GCS
         if result.get("success", False):
             output_path = result.get("result", {}).get("uri")
-            if output_path and os.path.exists(output_path):
+            data = result.pop("data", None)
+            if data is not None:
+                # Small outputs come back in memory and skip the disk round trip
+                result["result"]["gcs_uri"] = upload_to_gcs(
+                    data, OUTPUT_BUCKET, result["result"]["filename"]
+                )
+            elif output_path and os.path.exists(output_path):
                 # Upload to GCS
                 gcs_path = upload_to_gcs(output_path, OUTPUT_BUCKET)
                 
                 # Update the result with GCS path
                 result["result"]["gcs_uri"] = gcs_path
         
-        return jsonify(result)
+        return json_response(result)
     
     except Exception as e:
         logger.error(f"Error processing request: {e}")
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
-def upload_to_gcs(file_path: str, bucket_name: str) -> str:
+def upload_to_gcs(file_or_path: Union[str, bytes],
+                  bucket_name: str,
+                  filename: Optional[str] = None) -> str:
     """
-    Upload a file to Google Cloud Storage.
+    Upload a file or in-memory output to Google Cloud Storage.
     
     Args:
-        file_path: Path to the file to upload
+        file_or_path: Path to the file to upload, or the output bytes
         bucket_name: Name of the GCS bucket
+        filename: Object file name, required when uploading bytes
         
     Returns:
         GCS URI of the uploaded file
     """
     try:
         # Get the bucket
-        bucket = storage_client.bucket(bucket_name)
+        bucket = get_storage_client().bucket(bucket_name)
+        
+        # In-memory outputs are uploaded directly without touching the disk
+        if isinstance(file_or_path, bytes):
+            object_name = f"outputs/{filename}"
+            blob = bucket.blob(object_name, chunk_size=GCS_CHUNK_SIZE)
+            blob.upload_from_file(
+                io.BytesIO(file_or_path),
+                size=len(file_or_path),
+                checksum='md5',
+                timeout=GCS_UPLOAD_TIMEOUT
+            )
+            return f"gs://{bucket_name}/{object_name}"
+        
+        file_path = file_or_path
         
         # Generate a unique object name
-        object_name = f"outputs/{os.path.basename(file_path)}"
+        object_name = f"outputs/{filename or os.path.basename(file_path)}"
         
-        # Upload the file
-        blob = bucket.blob(object_name)
-        blob.upload_from_filename(file_path)
+        # Large outputs are uploaded as concurrent chunks by the transfer manager
+        if os.path.getsize(file_path) >= GCS_PARALLEL_THRESHOLD:
+            blob = bucket.blob(object_name)
+            transfer_manager.upload_chunks_concurrently(
+                file_path,
+                blob,
+                chunk_size=GCS_CHUNK_SIZE,
+                max_workers=GCS_PARALLEL_WORKERS,
+                worker_type=transfer_manager.THREAD
+            )
+        else:
+            # Upload the file as a chunked resumable upload so large outputs are
+            # streamed in bounded pieces and transient errors only retry one chunk
+            blob = bucket.blob(object_name, chunk_size=GCS_CHUNK_SIZE)
+            blob.upload_from_filename(file_path, timeout=GCS_UPLOAD_TIMEOUT)
         
         # Return the GCS URI
         return f"gs://{bucket_name}/{object_name}"
@@ -1,6 +1,23 @@
-from .normalizer import FormatNormalizer
-from .ai_analyzer import AIAnalysisModule
-from .cloud_integration import CloudStorageManager, FirestoreManager
-from .gemini_integration import GeminiFormatAnalyzer
+from importlib import import_module
 
-__version__ = "1.0.0"
\ No newline at end of file
+__version__ = "1.0.0"
+
+# Public classes are imported on first access so light entry points such as
+# the CLI do not load ffmpeg, Gemini and Google Cloud clients up front
+_EXPORTS = {
+    "FormatNormalizer": ".normalizer",
+    "AIAnalysisModule": ".ai_analyzer",
+    "CloudStorageManager": ".cloud_integration",
+    "FirestoreManager": ".cloud_integration",
+    "GeminiFormatAnalyzer": ".gemini_integration",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(import_module(_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,23 +1,299 @@
 import google.generativeai as genai
 import os
+import copy
+import asyncio
 import json
-from typing import Dict, Any, List, Optional
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# API key genai was last configured with; configure() is process-global
+_configured_api_key: Optional[str] = None
+
+def _configure_genai(api_key: str) -> None:
+    """Configure the Gemini SDK once per API key."""
+    global _configured_api_key
+    if _configured_api_key != api_key:
+        genai.configure(api_key=api_key)
+        _configured_api_key = api_key
+
+# Shared decoder used to extract a single JSON object from free-form responses
+_JSON_DECODER = json.JSONDecoder()
+
+def _decode_first_json(response_text: str, opener: str) -> Any:
+    """Decode the first JSON value starting at `opener`, ignoring text around it.
+    
+    Gemini sometimes adds explanatory text before or after the JSON, so exactly
+    one value is decoded from the first opening bracket; without one, the
+    whole response is parsed.
+    
+    Raises:
+        json.JSONDecodeError: If no valid JSON is found
+    """
+    start_idx = response_text.find(opener)
+    if start_idx >= 0:
+        value, _ = _JSON_DECODER.raw_decode(response_text, start_idx)
+        return value
+    return _json_loads(response_text)
+
+# Maximum number of cached Gemini recommendations per analyzer
+RECOMMENDATION_CACHE_SIZE = 1024
+
+# Compact JSON separators; indentation only inflates the prompt token count
+_COMPACT_SEPARATORS = (',', ':')
+
+# Static scaffold for the encoding analysis prompt, filled in per request
+_ANALYSIS_PROMPT_TEMPLATE = """You are an expert media encoding specialist. Analyze the following media metadata and recommend optimal encoding parameters for the specified target format.
+
+Source Media Metadata:
+```json
+{source}
+```
+
+Target Format Requirements:
+```json
+{target}
+```
+
+Based on the content characteristics and target format, provide recommendations for:
+1. Optimal codec parameters
+2. Bitrate strategy (VBR/CBR/CRF) with specific values
+3. Other FFmpeg parameters to optimize quality and file size
+4. Any content-specific optimizations
+
+Return your recommendations as a valid JSON object with the following structure:
+```json
+{{
+  "codec_parameters": {{}},
+  "bitrate_strategy": {{}},
+  "ffmpeg_options": [],
+  "optimizations": {{}}
+}}
+```
+
+Provide only the JSON response without any additional text.
+"""
+
+# Default fallback recommendations when no format/codec specific entry exists
+_DEFAULT_RECOMMENDATIONS = {
+    "codec_parameters": {},
+    "bitrate_strategy": {"type": "VBR", "value": "medium"},
+    "ffmpeg_options": [],
+    "optimizations": {}
+}
+
+_FALLBACK_VIDEO_FORMATS = ('mp4', 'mov', 'mkv')
+_FALLBACK_AUDIO_FORMATS = ('wav', 'mp3', 'aac', 'flac')
+
+# Codec specific overrides applied on top of the default recommendations
+_FALLBACK_VIDEO_CODECS = {
+    'h264': {
+        "codec_parameters": {"preset": "medium", "profile": "high"},
+        "bitrate_strategy": {"type": "CRF", "value": 23},
+        "ffmpeg_options": ["-movflags", "+faststart"]
+    },
+    'h265': {
+        "codec_parameters": {"preset": "medium", "profile": "main"},
+        "bitrate_strategy": {"type": "CRF", "value": 28}
+    },
+    'prores': {
+        "codec_parameters": {"profile": "standard"},
+        "bitrate_strategy": {"type": "CBR", "value": "45000k"}
+    },
+    'av1': {
+        "codec_parameters": {"preset": "medium", "tile-columns": 2, "row-mt": 1},
+        "bitrate_strategy": {"type": "CRF", "value": 30}
+    }
+}
+_FALLBACK_VIDEO_CODECS['hevc'] = _FALLBACK_VIDEO_CODECS['h265']
+
+_FALLBACK_AUDIO_CODECS = {
+    'aac': {
+        "codec_parameters": {"profile": "aac_low"},
+        "bitrate_strategy": {"type": "CBR", "value": "192k"}
+    },
+    'mp3': {
+        "bitrate_strategy": {"type": "CBR", "value": "320k"}
+    },
+    'flac': {
+        "codec_parameters": {"compression_level": 8}
+    }
+}
+
+# Fallback recommendations keyed by (format, codec), built once at import
+_FALLBACK_RECOMMENDATIONS = {
+    **{
+        (format_type, codec): {**_DEFAULT_RECOMMENDATIONS, **overrides}
+        for format_type in _FALLBACK_VIDEO_FORMATS
+        for codec, overrides in _FALLBACK_VIDEO_CODECS.items()
+    },
+    **{
+        (format_type, codec): {**_DEFAULT_RECOMMENDATIONS, **overrides}
+        for format_type in _FALLBACK_AUDIO_FORMATS
+        for codec, overrides in _FALLBACK_AUDIO_CODECS.items()
+    }
+}
+
+# Expected quality preservation for known (source codec, target codec) transcodes
+_VIDEO_QUALITY_PRESERVATION = {
+    **{(source, target): 85 for source in ("prores", "dnxhd") for target in ("h264", "h265")},
+    **{("h264", target): 95 for target in ("h265", "av1")}
+}
+_AUDIO_QUALITY_PRESERVATION = {
+    (source, target): 85 for source in ("pcm", "wav") for target in ("aac", "mp3")
+}
+
+# Static scaffold for a batched analysis prompt covering several requests at once
+_BATCH_PROMPT_TEMPLATE = """You are an expert media encoding specialist. For each request below, analyze the source media metadata and recommend optimal encoding parameters for its target format.
+
+Requests:
+```json
+{requests}
+```
+
+For every request, provide recommendations for:
+1. Optimal codec parameters
+2. Bitrate strategy (VBR/CBR/CRF) with specific values
+3. Other FFmpeg parameters to optimize quality and file size
+4. Any content-specific optimizations
+
+Return a valid JSON array containing one object per request with the following structure:
+```json
+[
+  {{
+    "id": 0,
+    "recommendations": {{
+      "codec_parameters": {{}},
+      "bitrate_strategy": {{}},
+      "ffmpeg_options": [],
+      "optimizations": {{}}
+    }}
+  }}
+]
+```
+
+Provide only the JSON response without any additional text.
+"""
+class GeminiBatcher:
+    """Coalesces concurrent recommendation requests into batched Gemini calls."""
+    
+    def __init__(self, analyzer: "GeminiMediaAnalyzer", batch_interval_ms: int = 20, max_batch: int = 8):
+        """Initialize the batcher.
+        
+        Args:
+            analyzer: Analyzer used to build prompts and issue Gemini calls
+            batch_interval_ms: How long to wait for more requests after the first one arrives
+            max_batch: Maximum number of requests combined into one call
+        """
+        self.analyzer = analyzer
+        self.batch_interval = batch_interval_ms / 1000
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Dispatches in flight; the event loop only holds weak references to tasks
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def submit(self, media_metadata: Dict[str, Any], target_format: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a request and wait for its recommendations.
+        
+        Args:
+            media_metadata: Technical metadata about the source media
+            target_format: Target format information
+            
+        Returns:
+            Dict containing recommended encoding parameters
+        """
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((media_metadata, target_format, future))
+        return await future
+    
+    async def _run(self) -> None:
+        """Drain the queue into batches and dispatch them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_interval
+            
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            task = loop.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _dispatch(self, batch: List[Tuple[Dict[str, Any], Dict[str, Any], asyncio.Future]]) -> None:
+        """Resolve every waiter in a batch, falling back to single calls if needed."""
+        if len(batch) > 1:
+            try:
+                results = await self.analyzer._request_batch_recommendations(
+                    [(metadata, target) for metadata, target, _ in batch]
+                )
+                for (_, _, future), recommendations in zip(batch, results):
+                    if not future.done():
+                        future.set_result(recommendations)
+                return
+            except ValueError as e:
+                print(f"Error parsing batched Gemini recommendations: {e}")
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        
+        # Single request, or batched response could not be parsed
+        async def resolve(metadata, target, future):
+            try:
+                result = await self.analyzer._request_recommendations(metadata, target)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+        
+        await asyncio.gather(*(resolve(*item) for item in batch))
 
 class GeminiMediaAnalyzer:
     """Media analysis module using Google's Gemini API for content-aware encoding decisions."""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, enable_batching: bool = False,
+                 batch_interval_ms: int = 20, max_batch: int = 8):
         """Initialize the Gemini Media Analyzer.
         
         Args:
             api_key: Gemini API key. If None, tries to get from GEMINI_API_KEY environment variable.
+            enable_batching: Whether to coalesce concurrent requests into batched Gemini calls
+            batch_interval_ms: Batching window in milliseconds
+            max_batch: Maximum number of requests per batched call
         """
         self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
         if not self.api_key:
             raise ValueError("Gemini API key must be provided or set as GEMINI_API_KEY environment variable")
         
-        genai.configure(api_key=self.api_key)
+        _configure_genai(self.api_key)
         self.model = genai.GenerativeModel('gemini-1.5-pro')
+        
+        # LRU cache of parsed recommendations keyed by request content hash
+        self._recommendation_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        
+        # Optional request coalescing for high-concurrency workloads
+        self._batcher = GeminiBatcher(self, batch_interval_ms, max_batch) if enable_batching else None
     
     async def analyze_media_content(self, media_metadata: Dict[str, Any], target_format: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze media content and recommend optimal encoding parameters.
@@ -29,118 +305,108 @@ class GeminiMediaAnalyzer:
         Returns:
             Dict containing recommended encoding parameters
         """
-        # Prepare the prompt for Gemini API
-        prompt = self._build_analysis_prompt(media_metadata, target_format)
-        
-        # Get recommendations from Gemini
-        response = await self.model.generate_content_async(prompt)
+        # Serve identical (metadata, target) requests from the cache
+        cache_key = self._cache_key(media_metadata, target_format)
+        cached = self._recommendation_cache.get(cache_key)
+        if cached is not None:
+            self._recommendation_cache.move_to_end(cache_key)
+            return copy.deepcopy(cached)
         
-        # Extract and parse recommendations
+        # Get recommendations from Gemini, batched with concurrent requests if enabled
         try:
-            recommendations = self._parse_recommendations(response.text)
-            return recommendations
-        except Exception as e:
+            if self._batcher:
+                recommendations = await self._batcher.submit(media_metadata, target_format)
+            else:
+                recommendations = await self._request_recommendations(media_metadata, target_format)
+        except ValueError as e:
             print(f"Error parsing Gemini recommendations: {e}")
             # Return basic fallback recommendations if parsing fails
             return self._get_fallback_recommendations(target_format)
+        
+        self._store_recommendation(cache_key, recommendations)
+        return recommendations
+    
+    async def _request_recommendations(self, media_metadata: Dict[str, Any],
+                                       target_format: Dict[str, Any]) -> Dict[str, Any]:
+        """Request recommendations for a single media file from Gemini.
+        
+        Raises:
+            ValueError: If the response does not contain valid JSON
+        """
+        prompt = self._build_analysis_prompt(media_metadata, target_format)
+        response = await self.model.generate_content_async(prompt)
+        return self._parse_recommendations(response.text)
+    
+    async def _request_batch_recommendations(
+            self, requests: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Request recommendations for several media files in one Gemini call.
+        
+        Raises:
+            ValueError: If the response is not a JSON array covering every request
+        """
+        payload = [
+            {"id": index, "source": metadata, "target": target}
+            for index, (metadata, target) in enumerate(requests)
+        ]
+        prompt = _BATCH_PROMPT_TEMPLATE.format(
+            requests=json.dumps(payload, separators=_COMPACT_SEPARATORS)
+        )
+        response = await self.model.generate_content_async(prompt)
+        response_text = response.text
+        
+        try:
+            items = _decode_first_json(response_text, '[')
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Could not parse batched Gemini response: {e}")
+        if not isinstance(items, list):
+            raise ValueError("No JSON array found in batched Gemini response")
+        
+        by_id = {
+            item.get("id"): item.get("recommendations")
+            for item in items
+            if isinstance(item, dict) and isinstance(item.get("recommendations"), dict)
+        }
+        if any(index not in by_id for index in range(len(requests))):
+            raise ValueError("Batched Gemini response is missing recommendations")
+        return [by_id[index] for index in range(len(requests))]
+    
+    def _cache_key(self, media_metadata: Dict[str, Any], target_format: Dict[str, Any]) -> str:
+        """Compute a stable hash of the request used as the recommendation cache key."""
+        payload = json.dumps([media_metadata, target_format], sort_keys=True,
+                             separators=_COMPACT_SEPARATORS, default=str)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+    
+    def _store_recommendation(self, cache_key: str, recommendations: Dict[str, Any]) -> None:
+        """Store parsed recommendations in the cache, evicting the least recently used entry."""
+        self._recommendation_cache[cache_key] = copy.deepcopy(recommendations)
+        self._recommendation_cache.move_to_end(cache_key)
+        while len(self._recommendation_cache) > RECOMMENDATION_CACHE_SIZE:
+            self._recommendation_cache.popitem(last=False)
     
     def _build_analysis_prompt(self, media_metadata: Dict[str, Any], target_format: Dict[str, Any]) -> str:
         """Build a prompt for Gemini to analyze media and recommend encoding parameters."""
-        return f"""You are an expert media encoding specialist. Analyze the following media metadata and recommend 
-        optimal encoding parameters for the specified target format.
-        
-        Source Media Metadata:
-        ```json
-        {json.dumps(media_metadata, indent=2)}
-        ```
-        
-        Target Format Requirements:
-        ```json
-        {json.dumps(target_format, indent=2)}
-        ```
-        
-        Based on the content characteristics and target format, provide recommendations for:
-        1. Optimal codec parameters
-        2. Bitrate strategy (VBR/CBR/CRF) with specific values
-        3. Other FFmpeg parameters to optimize quality and file size
-        4. Any content-specific optimizations
-        
-        Return your recommendations as a valid JSON object with the following structure:
-        ```json
-        {{
-          "codec_parameters": {{}},
-          "bitrate_strategy": {{}},
-          "ffmpeg_options": [],
-          "optimizations": {{}}
-        }}
-        ```
-        
-        Provide only the JSON response without any additional text.
-        """
+        return _ANALYSIS_PROMPT_TEMPLATE.format(
+            source=json.dumps(media_metadata, separators=_COMPACT_SEPARATORS),
+            target=json.dumps(target_format, separators=_COMPACT_SEPARATORS)
+        )
     
     def _parse_recommendations(self, response_text: str) -> Dict[str, Any]:
         """Parse the recommendations from Gemini's response."""
-        # Extract JSON from response text - sometimes Gemini includes explanatory text
         try:
-            # Try to find JSON block in the response if it's not a pure JSON response
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}')
-            
-            if start_idx >= 0 and end_idx > start_idx:
-                json_str = response_text[start_idx:end_idx+1]
-                return json.loads(json_str)
-            else:
-                # If no JSON found, try to parse the whole response
-                return json.loads(response_text)
+            return _decode_first_json(response_text, '{')
         except json.JSONDecodeError:
             raise ValueError(f"Could not parse valid JSON from Gemini response: {response_text}")
     
     def _get_fallback_recommendations(self, target_format: Dict[str, Any]) -> Dict[str, Any]:
         """Get fallback encoding recommendations based on target format."""
-        format_type = target_format.get('format', '').lower()
-        codec = target_format.get('codec', '').lower()
-        
-        # Default recommendations
-        recommendations = {
-            "codec_parameters": {},
-            "bitrate_strategy": {"type": "VBR", "value": "medium"},
-            "ffmpeg_options": [],
-            "optimizations": {}
-        }
-        
-        # Video-specific recommendations
-        if format_type in ['mp4', 'mov', 'mkv']:
-            if codec == 'h264':
-                recommendations["codec_parameters"] = {"preset": "medium", "profile": "high"}
-                recommendations["bitrate_strategy"] = {"type": "CRF", "value": 23}
-                recommendations["ffmpeg_options"] = ["-movflags", "+faststart"]
-            elif codec == 'h265' or codec == 'hevc':
-                recommendations["codec_parameters"] = {"preset": "medium", "profile": "main"}
-                recommendations["bitrate_strategy"] = {"type": "CRF", "value": 28}
-            elif codec == 'prores':
-                recommendations["codec_parameters"] = {"profile": "standard"}
-                recommendations["bitrate_strategy"] = {"type": "CBR", "value": "45000k"}
-            elif codec == 'av1':
-                recommendations["codec_parameters"] = {"preset": "medium", "tile-columns": 2, "row-mt": 1}
-                recommendations["bitrate_strategy"] = {"type": "CRF", "value": 30}
-        
-        # Audio-specific recommendations
-        elif format_type in ['wav', 'mp3', 'aac', 'flac']:
-            if codec == 'aac':
-                recommendations["codec_parameters"] = {"profile": "aac_low"}
-                recommendations["bitrate_strategy"] = {"type": "CBR", "value": "192k"}
-            elif codec == 'mp3':
-                recommendations["bitrate_strategy"] = {"type": "CBR", "value": "320k"}
-            elif codec == 'flac':
-                recommendations["codec_parameters"] = {"compression_level": 8}
-        
-        return recommendations
+        key = (target_format.get('format', '').lower(), target_format.get('codec', '').lower())
+        return copy.deepcopy(_FALLBACK_RECOMMENDATIONS.get(key, _DEFAULT_RECOMMENDATIONS))
 
 class AIAnalysisModule:
     """Module that integrates various AI analysis capabilities for media processing."""
     
-    def __init__(self, api_key: Optional[str] = None):
-        self.gemini_analyzer = GeminiMediaAnalyzer(api_key)
+    def __init__(self, api_key: Optional[str] = None, enable_batching: bool = False):
+        self.gemini_analyzer = GeminiMediaAnalyzer(api_key, enable_batching=enable_batching)
     
     async def analyze_content(self, media_path: str, media_metadata: Dict[str, Any], 
                             target_format: Dict[str, Any]) -> Dict[str, Any]:
@@ -154,16 +420,26 @@ class AIAnalysisModule:
         Returns:
             Dict containing AI analysis results and recommendations
         """
-        # Get encoding recommendations from Gemini
-        encoding_recommendations = await self.gemini_analyzer.analyze_media_content(
-            media_metadata, target_format
+        # Start the Gemini request first so the local estimates run while it is in flight
+        recommendations_task = asyncio.create_task(
+            self.gemini_analyzer.analyze_media_content(media_metadata, target_format)
         )
+        # Yield once so the task reaches its network await before the local work
+        await asyncio.sleep(0)
+        try:
+            content_type = self._infer_content_type(media_metadata)
+            quality_preservation = self._calculate_quality_preservation(media_metadata, target_format)
+        except Exception:
+            recommendations_task.cancel()
+            raise
+        
+        encoding_recommendations = await recommendations_task
         
         # Combine all analysis results
         analysis_results = {
             "encoding_recommendations": encoding_recommendations,
-            "content_type": self._infer_content_type(media_metadata),
-            "quality_preservation": self._calculate_quality_preservation(media_metadata, target_format),
+            "content_type": content_type,
+            "quality_preservation": quality_preservation,
             "optimizations": encoding_recommendations.get("optimizations", {})
         }
         
@@ -173,7 +449,7 @@ class AIAnalysisModule:
         """Infer the type of content based on metadata."""
         # Simple inference based on metadata
         if "video" in media_metadata:
-            frame_rate = media_metadata.get("video", {}).get("frame_rate", 0)
+            frame_rate = (media_metadata["video"] or {}).get("frame_rate", 0)
             if frame_rate < 24:
                 return "animation"
             elif frame_rate >= 48:
@@ -181,7 +457,7 @@ class AIAnalysisModule:
             else:
                 return "general"
         elif "audio" in media_metadata:
-            channels = media_metadata.get("audio", {}).get("channels", 0)
+            channels = (media_metadata["audio"] or {}).get("channels", 0)
             if channels > 2:
                 return "surround"
             else:
@@ -197,30 +473,27 @@ class AIAnalysisModule:
         
         # Video quality estimation
         if "video" in media_metadata:
-            source_codec = media_metadata.get("video", {}).get("codec", "")
+            source_codec = (media_metadata["video"] or {}).get("codec", "")
             target_codec = target_format.get("codec", "")
             
             # Estimate quality preservation percentage
             if source_codec == target_codec:
                 quality_metrics["video_quality"] = 100
-            elif source_codec in ["prores", "dnxhd"] and target_codec in ["h264", "h265"]:
-                quality_metrics["video_quality"] = 85
-            elif source_codec in ["h264"] and target_codec in ["h265", "av1"]:
-                quality_metrics["video_quality"] = 95
             else:
-                quality_metrics["video_quality"] = 80
+                quality_metrics["video_quality"] = _VIDEO_QUALITY_PRESERVATION.get(
+                    (source_codec, target_codec), 80
+                )
         
         # Audio quality estimation
         if "audio" in media_metadata:
-            source_codec = media_metadata.get("audio", {}).get("codec", "")
-            source_sample_rate = media_metadata.get("audio", {}).get("sample_rate", 0)
+            source_codec = (media_metadata["audio"] or {}).get("codec", "")
             target_codec = target_format.get("audio_codec", "")
             
             if source_codec == target_codec:
                 quality_metrics["audio_quality"] = 100
-            elif source_codec in ["pcm", "wav"] and target_codec in ["aac", "mp3"]:
-                quality_metrics["audio_quality"] = 85
             else:
-                quality_metrics["audio_quality"] = 90
+                quality_metrics["audio_quality"] = _AUDIO_QUALITY_PRESERVATION.get(
+                    (source_codec, target_codec), 90
+                )
                 
-        return quality_metrics
\ No newline at end of file
+        return quality_metrics
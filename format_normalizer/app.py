@@ -1,14 +1,28 @@
 from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Dict, Any, List, Optional
 import os
 import uuid
+import tempfile
 import json
 import asyncio
+import aiofiles
+import aiohttp
 from datetime import datetime
 import logging
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
 from .normalizer import FormatNormalizer
 from .ai_analyzer import AIAnalysisModule
 from .cloud_integration import CloudStorageManager, FirestoreManager
@@ -17,11 +31,18 @@ from .cloud_integration import CloudStorageManager, FirestoreManager
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Parent directory for per-job scratch space
+JOB_TEMP_DIR = os.environ.get("JOB_TEMP_DIR", "/tmp")
+
+# Buffer size used when streaming uploads and downloads to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 # Initialize FastAPI app
 app = FastAPI(
     title="FormatNormalizer API",
     description="API for media format normalization and conversion",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse if orjson is not None else JSONResponse
 )
 
 # Add CORS middleware
@@ -38,11 +59,12 @@ normalizer = None
 ai_module = None
 storage_manager = None
 firestore_manager = None
+http_session = None
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on application startup."""
-    global normalizer, ai_module, storage_manager, firestore_manager
+    global normalizer, ai_module, storage_manager, firestore_manager, http_session
     
     # Get configuration from environment variables
     gemini_api_key = os.environ.get("GEMINI_API_KEY")
@@ -53,11 +75,24 @@ async def startup_event():
     normalizer = FormatNormalizer()
     ai_module = AIAnalysisModule(api_key=gemini_api_key)
     
+    # Shared HTTP session so source downloads reuse pooled keep-alive connections
+    http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=64, limit_per_host=16, ttl_dns_cache=300)
+    )
+    
     # Initialize cloud services if running in cloud environment
     if os.environ.get("CLOUD_RUN") or os.environ.get("CLOUD_FUNCTIONS"):
         storage_manager = CloudStorageManager(bucket_name=gcs_bucket_name)
         firestore_manager = FirestoreManager(collection_name=firestore_collection)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared resources on application shutdown."""
+    if http_session:
+        await http_session.close()
+    if storage_manager:
+        await storage_manager.close()
+
 @app.get("/")
 async def root():
     """Root endpoint providing basic API information."""
@@ -91,17 +126,13 @@ async def normalize_media(
     
     # Parse target format JSON
     try:
-        target_format_dict = json.loads(target_format)
+        target_format_dict = _json_loads(target_format)
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid target_format JSON")
     
     # Generate a unique job ID
     job_id = str(uuid.uuid4())
     
-    # Create a temporary directory for this job
-    job_dir = f"/tmp/{job_id}"
-    os.makedirs(job_dir, exist_ok=True)
-    
     # Prepare job data
     job_data = {
         "id": job_id,
@@ -123,7 +154,6 @@ async def normalize_media(
     background_tasks.add_task(
         process_normalization_job,
         job_id=job_id,
-        job_dir=job_dir,
         file=file,
         source_url=source_url,
         target_format_dict=target_format_dict,
@@ -160,133 +190,140 @@ async def list_jobs(status: Optional[str] = None, limit: int = 100):
     # If not using Firestore
     raise HTTPException(status_code=501, detail="Job listing not available without Firestore integration")
 
+# Static catalog responses, serialized once at import time
+_PRESETS_JSON = _json_dumps({
+    "presets": [
+        {
+            "name": "web",
+            "description": "Optimized for web delivery, good balance of quality and file size",
+            "formats": ["mp4", "webm", "mp3", "jpg", "png"]
+        },
+        {
+            "name": "social",
+            "description": "Optimized for social media platforms",
+            "formats": ["mp4", "mov", "mp3", "jpg"]
+        },
+        {
+            "name": "broadcast",
+            "description": "High quality for broadcast delivery",
+            "formats": ["mov", "mxf", "wav"]
+        },
+        {
+            "name": "archive",
+            "description": "Maximum quality for archival purposes",
+            "formats": ["mov", "mxf", "wav", "tiff"]
+        },
+        {
+            "name": "mobile",
+            "description": "Optimized for mobile devices with lower bandwidth",
+            "formats": ["mp4", "mp3", "jpg"]
+        }
+    ]
+})
+
+_FORMATS_JSON = _json_dumps({
+    "video": {
+        "formats": ["mp4", "mov", "mkv", "webm", "mxf", "avi"],
+        "codecs": ["h264", "h265", "prores", "av1", "vp9", "dnxhd", "xvid"]
+    },
+    "audio": {
+        "formats": ["mp3", "wav", "aac", "flac", "ogg", "m4a"],
+        "codecs": ["mp3", "aac", "flac", "opus", "pcm", "vorbis"]
+    },
+    "image": {
+        "formats": ["jpg", "png", "tiff", "webp", "avif"],
+        "codecs": ["jpeg", "png", "tiff", "webp", "avif"]
+    }
+})
+
 @app.get("/api/presets")
 async def get_presets():
     """Get available normalization presets."""
-    return {
-        "presets": [
-            {
-                "name": "web",
-                "description": "Optimized for web delivery, good balance of quality and file size",
-                "formats": ["mp4", "webm", "mp3", "jpg", "png"]
-            },
-            {
-                "name": "social",
-                "description": "Optimized for social media platforms",
-                "formats": ["mp4", "mov", "mp3", "jpg"]
-            },
-            {
-                "name": "broadcast",
-                "description": "High quality for broadcast delivery",
-                "formats": ["mov", "mxf", "wav"]
-            },
-            {
-                "name": "archive",
-                "description": "Maximum quality for archival purposes",
-                "formats": ["mov", "mxf", "wav", "tiff"]
-            },
-            {
-                "name": "mobile",
-                "description": "Optimized for mobile devices with lower bandwidth",
-                "formats": ["mp4", "mp3", "jpg"]
-            }
-        ]
-    }
+    return Response(content=_PRESETS_JSON, media_type="application/json")
 
 @app.get("/api/formats")
 async def get_formats():
     """Get supported media formats and codecs."""
-    return {
-        "video": {
-            "formats": ["mp4", "mov", "mkv", "webm", "mxf", "avi"],
-            "codecs": ["h264", "h265", "prores", "av1", "vp9", "dnxhd", "xvid"]
-        },
-        "audio": {
-            "formats": ["mp3", "wav", "aac", "flac", "ogg", "m4a"],
-            "codecs": ["mp3", "aac", "flac", "opus", "pcm", "vorbis"]
-        },
-        "image": {
-            "formats": ["jpg", "png", "tiff", "webp", "avif"],
-            "codecs": ["jpeg", "png", "tiff", "webp", "avif"]
-        }
-    }
+    return Response(content=_FORMATS_JSON, media_type="application/json")
 
-async def process_normalization_job(job_id: str, job_dir: str, file: Optional[UploadFile], 
+async def process_normalization_job(job_id: str, file: Optional[UploadFile], 
                                   source_url: Optional[str], target_format_dict: Dict[str, Any],
                                   preset: str, enable_ai: bool, validate_output: bool):
     """Background task to process a normalization job."""
-    try:
-        # Update job status to processing
-        if firestore_manager:
-            await firestore_manager.update_job(job_id, {"status": "processing"})
-        
-        # Save the uploaded file or download from URL
-        source_path = None
-        if file:
-            source_path = f"{job_dir}/source_{file.filename}"
-            with open(source_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
-        elif source_url:
-            source_path = f"{job_dir}/source_file"
-            # Download from URL logic
-            # For cloud deployment, use storage_manager
-            if storage_manager and source_url.startswith("gs://"):
-                blob_name = source_url.replace("gs://", "").split("/", 1)[1]
-                source_path = await storage_manager.download_file(blob_name, source_path)
-            else:
-                # Use requests or aiohttp to download from HTTP URL
-                pass
-        
-        # Destination path for normalized file
-        output_path = f"{job_dir}/normalized_output.{target_format_dict.get('format', 'mp4')}"
-        
-        # Perform normalization
-        normalization_result = await normalizer.normalize(
-            source_path=source_path,
-            output_path=output_path,
-            target_format=target_format_dict,
-            preset=preset,
-            enable_ai=enable_ai,
-            validate_output=validate_output
-        )
-        
-        # Upload the result to Cloud Storage if available
-        result_url = None
-        if storage_manager and os.path.exists(output_path):
-            blob_name = f"normalized/{job_id}/{os.path.basename(output_path)}"
-            result_url = await storage_manager.upload_file(output_path, blob_name)
-        
-        # Update job with results
-        job_result = {
-            "status": "completed",
-            "completed_at": datetime.now().isoformat(),
-            "result": normalization_result,
-            "result_url": result_url
-        }
-        
-        if firestore_manager:
-            await firestore_manager.update_job(job_id, job_result)
-        
-        # Clean up temporary files
-        if os.path.exists(job_dir):
-            import shutil
-            shutil.rmtree(job_dir)
+    # Scratch directory for this job, removed on success and failure alike
+    with tempfile.TemporaryDirectory(prefix=f"{job_id}_", dir=JOB_TEMP_DIR) as job_dir:
+        try:
+            # Update job status to processing
+            if firestore_manager:
+                await firestore_manager.update_job(job_id, {"status": "processing"})
             
-    except Exception as e:
-        logger.error(f"Error processing job {job_id}: {str(e)}")
-        
-        # Update job with error
-        error_data = {
-            "status": "failed",
-            "error": str(e),
-            "completed_at": datetime.now().isoformat()
-        }
-        
-        if firestore_manager:
-            await firestore_manager.update_job(job_id, error_data)
-        
-        # Clean up temporary files
-        if os.path.exists(job_dir):
-            import shutil
-            shutil.rmtree(job_dir)
\ No newline at end of file
+            # Save the uploaded file or download from URL
+            source_path = None
+            if file:
+                source_path = f"{job_dir}/source_{file.filename}"
+                async with aiofiles.open(source_path, "wb") as f:
+                    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                        await f.write(chunk)
+            elif source_url:
+                source_path = f"{job_dir}/source_file"
+                # Download from URL logic
+                # For cloud deployment, use storage_manager
+                if storage_manager and source_url.startswith("gs://"):
+                    blob_name = source_url.replace("gs://", "").split("/", 1)[1]
+                    # Let FFmpeg read the object directly over a signed URL instead of
+                    # staging a full copy in /tmp; download only if signing is unavailable
+                    try:
+                        source_path = storage_manager.signed_url(blob_name)
+                    except Exception as e:
+                        logger.warning(f"Could not sign URL for {source_url}, downloading instead: {e}")
+                        source_path = await storage_manager.download_file(blob_name, source_path)
+                else:
+                    # Download from HTTP URL using the shared session
+                    async with http_session.get(source_url) as response:
+                        response.raise_for_status()
+                        async with aiofiles.open(source_path, "wb") as f:
+                            async for chunk in response.content.iter_chunked(UPLOAD_CHUNK_SIZE):
+                                await f.write(chunk)
+            
+            # Destination path for normalized file
+            output_path = f"{job_dir}/normalized_output.{target_format_dict.get('format', 'mp4')}"
+            
+            # Perform normalization
+            normalization_result = await normalizer.normalize(
+                source_path=source_path,
+                output_path=output_path,
+                target_format=target_format_dict,
+                preset=preset,
+                enable_ai=enable_ai,
+                validate_output=validate_output
+            )
+            
+            # Upload the result to Cloud Storage if available
+            result_url = None
+            if storage_manager and os.path.exists(output_path):
+                blob_name = f"normalized/{job_id}/{os.path.basename(output_path)}"
+                result_url = await storage_manager.upload_file(output_path, blob_name)
+            
+            # Update job with results
+            job_result = {
+                "status": "completed",
+                "completed_at": datetime.now().isoformat(),
+                "result": normalization_result,
+                "result_url": result_url
+            }
+            
+            if firestore_manager:
+                await firestore_manager.update_job(job_id, job_result)
+
+        except Exception as e:
+            logger.error(f"Error processing job {job_id}: {str(e)}")
+            
+            # Update job with error
+            error_data = {
+                "status": "failed",
+                "error": str(e),
+                "completed_at": datetime.now().isoformat()
+            }
+            
+            if firestore_manager:
+                await firestore_manager.update_job(job_id, error_data)
@@ -6,18 +6,62 @@ import json
 import argparse
 import asyncio
 import logging
+import functools
+from types import MappingProxyType
 from typing import Dict, Any, Optional
 
-from .normalizer import FormatNormalizer
-from .__init__ import __version__
+from . import __version__
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps_bytes(obj: Any) -> bytes:
+        return json.dumps(obj, indent=2).encode("utf-8")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Segments queued between the encoder and the uploader before ffmpeg is held back
+PIPELINE_QUEUE_SIZE = 2
+
+# Default codec for each target format when none is given
+CODEC_MAP = MappingProxyType({
+    'mp4': 'h264',
+    'mov': 'prores',
+    'webm': 'vp9',
+    'mkv': 'h265',
+    'mp3': 'mp3',
+    'wav': 'pcm_s16le'
+})
+
+
+@functools.lru_cache(maxsize=None)
+def _auto_codec(fmt: str) -> str:
+    """Return the default codec for a target format."""
+    return CODEC_MAP.get(fmt, 'h264')
+
+
+@functools.lru_cache(maxsize=16)
+def _parse_parameters(raw: str) -> Any:
+    """Decode a custom parameters JSON string, reusing results for repeated input.
+    
+    The returned object is shared between calls and must not be mutated.
+    """
+    return _json_loads(raw)
+
 
 async def normalize_media(args: argparse.Namespace) -> None:
     """Normalize media files based on command-line arguments."""
+    # Imported here so --help and argument errors skip loading ffmpeg and cloud clients
+    from .normalizer import FormatNormalizer
+    
     # Initialize normalizer
     normalizer = FormatNormalizer(ai_api_key=args.api_key, temp_dir=args.temp_dir)
     
@@ -30,7 +74,7 @@ async def normalize_media(args: argparse.Namespace) -> None:
     # Add custom parameters if provided
     if args.parameters:
         try:
-            custom_params = json.loads(args.parameters)
+            custom_params = _parse_parameters(args.parameters)
             target_format["parameters"] = custom_params
         except json.JSONDecodeError:
             logger.error("Invalid JSON format for parameters")
@@ -46,14 +90,14 @@ async def normalize_media(args: argparse.Namespace) -> None:
             source_path=args.input,
             output_path=args.output,
             target_format=target_format,
-            preset=args.preset,
+            preset=args.preset or 'standard',
             enable_ai=args.ai,
-            validate_output=args.validate
+            validate_output=args.validate is not False
         )
         
         # Print results
         if args.verbose:
-            print(json.dumps(result, indent=2))
+            print(_json_dumps_bytes(result).decode())
         else:
             print(f"\nNormalization completed successfully")
             print(f"Output file: {result['result']['uri']}")
@@ -71,8 +115,8 @@ async def normalize_media(args: argparse.Namespace) -> None:
             
         # Save detailed results if requested
         if args.output_json:
-            with open(args.output_json, 'w') as f:
-                json.dump(result, f, indent=2)
+            with open(args.output_json, 'wb') as f:
+                f.write(_json_dumps_bytes(result))
                 logger.info(f"Detailed results saved to {args.output_json}")
         
     except Exception as e:
@@ -80,8 +124,116 @@ async def normalize_media(args: argparse.Namespace) -> None:
         sys.exit(1)
 
 
-def main() -> None:
-    """Main entry point for the command-line interface."""
+async def _encode_segments(cmd: list, queue: asyncio.Queue) -> int:
+    """Run ffmpeg and queue each segment as soon as it has been fully written.
+    
+    Args:
+        cmd: FFmpeg command writing through the segment muxer
+        queue: Queue receiving completed segment paths, then None
+        
+    Returns:
+        FFmpeg exit code
+    """
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    
+    current = None
+    try:
+        async for raw in process.stderr:
+            line = raw.decode(errors='replace')
+            # The segment muxer opens the next file only once the previous one is closed
+            if "[segment @" in line and "Opening '" in line:
+                if current:
+                    await queue.put(current)
+                current = line.split("Opening '", 1)[1].split("'", 1)[0]
+        
+        returncode = await process.wait()
+    finally:
+        # Don't leave ffmpeg encoding if reading fails or the pipeline is cancelled
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if current and returncode == 0:
+        await queue.put(current)
+    await queue.put(None)
+    return returncode
+
+
+async def _upload_segments(storage_manager, queue: asyncio.Queue, prefix: str, workers: int) -> list:
+    """Upload segments from the queue while encoding continues.
+    
+    Args:
+        storage_manager: CloudStorageManager used for the uploads
+        queue: Queue of completed segment paths, terminated by None
+        prefix: Blob name prefix for the uploaded segments
+        workers: Maximum number of concurrent uploads
+        
+    Returns:
+        URLs of the uploaded segments in encoding order
+    """
+    semaphore = asyncio.Semaphore(workers)
+    
+    async def upload(path: str) -> str:
+        async with semaphore:
+            # upload_file already retries transient errors, so failures here are final
+            return await storage_manager.upload_file(path, f"{prefix}/{os.path.basename(path)}")
+    
+    tasks = []
+    while (path := await queue.get()) is not None:
+        tasks.append(asyncio.create_task(upload(path)))
+    return await asyncio.gather(*tasks)
+
+
+async def pipeline_media(args: argparse.Namespace) -> None:
+    """Encode into segments and upload each one while the next is being encoded."""
+    from .cloud_integration import CloudStorageManager
+    from .normalizer import _CODEC_MAP
+    
+    storage_manager = CloudStorageManager(args.bucket)
+    
+    # Write numbered segments next to the requested output
+    stem, ext = os.path.splitext(os.path.abspath(args.output))
+    os.makedirs(os.path.dirname(stem), exist_ok=True)
+    codec_flag = '-c:a' if args.format in ('mp3', 'wav') else '-c:v'
+    # Translate codec names FFmpeg doesn't accept (e.g. h265) into encoder names
+    encoder = _CODEC_MAP.get(args.codec, args.codec)
+    # -nostats: the \r-redrawn stats line never ends in \n and would overflow the line reader
+    cmd = [
+        "ffmpeg", "-y", "-nostats", "-i", args.input,
+        codec_flag, encoder,
+        "-f", "segment",
+        "-segment_time", str(args.segment_time),
+        "-reset_timestamps", "1",
+        f"{stem}_%05d{ext or '.' + args.format}"
+    ]
+    
+    queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    prefix = f"normalized/{os.path.basename(stem)}"
+    try:
+        returncode, urls = await asyncio.gather(
+            _encode_segments(cmd, queue),
+            _upload_segments(storage_manager, queue, prefix, args.upload_workers)
+        )
+    except Exception as e:
+        logger.error(f"Pipelined normalization failed: {e}")
+        sys.exit(1)
+    
+    if returncode != 0:
+        logger.error(f"FFmpeg exited with code {returncode}")
+        sys.exit(1)
+    
+    print(f"\nNormalization completed successfully")
+    print(f"Uploaded {len(urls)} segments to gs://{args.bucket}/{prefix}/")
+    if args.verbose:
+        for url in urls:
+            print(f"  - {url}")
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the command-line argument parser."""
     parser = argparse.ArgumentParser(description="FormatNormalizer - Media format normalization tool")
     parser.add_argument('-v', '--version', action='version', version=f'FormatNormalizer {__version__}')
     
@@ -92,22 +244,51 @@ def main() -> None:
     # Format options
     parser.add_argument('-f', '--format', default='mp4', help='Target format (e.g., mp4, mov, webm)')
     parser.add_argument('-c', '--codec', help='Target codec (e.g., h264, h265, prores)')
-    parser.add_argument('-p', '--preset', default='standard',
+    # Preset and validation default to None so --pipeline can tell if they were given
+    parser.add_argument('-p', '--preset',
                         choices=['web', 'social', 'standard', 'broadcast', 'archive', 'mobile'],
-                        help='Quality preset')
+                        help='Quality preset (default: standard)')
     parser.add_argument('--parameters', help='Additional parameters as JSON string')
     
     # Processing options
     parser.add_argument('--ai', action='store_true', help='Enable AI-powered optimization')
     parser.add_argument('--api-key', help='Gemini API key for AI features')
-    parser.add_argument('--validate', action='store_true', default=True, help='Validate output file')
+    parser.add_argument('--validate', action='store_true', default=None, help='Validate output file (default)')
     parser.add_argument('--temp-dir', help='Directory for temporary files')
     
+    # Pipelined encode and upload options
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Encode into segments and upload each to GCS while the next is encoded')
+    parser.add_argument('--bucket', help='GCS bucket for pipelined uploads')
+    parser.add_argument('--segment-time', type=float, default=10, help='Segment length in seconds')
+    parser.add_argument('--upload-workers', type=int, default=4, help='Concurrent segment uploads')
+    
     # Output options
     parser.add_argument('--verbose', action='store_true', help='Print detailed output')
     parser.add_argument('--output-json', help='Save detailed results to JSON file')
     
-    args = parser.parse_args()
+    return parser
+
+
+_PARSER = _build_parser()
+
+
+def main() -> None:
+    """Main entry point for the command-line interface."""
+    args = _PARSER.parse_args()
+    
+    if args.pipeline:
+        # The segment pipeline runs FFmpeg directly and can't apply these options
+        unsupported = [
+            flag for flag, given in (
+                ('--preset', args.preset is not None),
+                ('--parameters', args.parameters is not None),
+                ('--ai', args.ai),
+                ('--validate', args.validate is not None),
+            ) if given
+        ]
+        if unsupported:
+            _PARSER.error(f"{', '.join(unsupported)} cannot be used with --pipeline")
     
     # Check that input file exists
     if not os.path.exists(args.input):
@@ -116,15 +297,7 @@ def main() -> None:
     
     # Auto-determine codec if not specified
     if not args.codec:
-        codec_map = {
-            'mp4': 'h264',
-            'mov': 'prores',
-            'webm': 'vp9',
-            'mkv': 'h265',
-            'mp3': 'mp3',
-            'wav': 'pcm_s16le'
-        }
-        args.codec = codec_map.get(args.format, 'h264')
+        args.codec = _auto_codec(args.format)
         logger.info(f"Auto-selected codec: {args.codec} for format: {args.format}")
     
     # Check for Gemini API key if AI is enabled
@@ -136,7 +309,13 @@ def main() -> None:
             sys.exit(1)
     
     # Run the async normalization function
-    asyncio.run(normalize_media(args))
+    if args.pipeline:
+        if not args.bucket:
+            print("Error: --bucket is required with --pipeline.")
+            sys.exit(1)
+        asyncio.run(pipeline_media(args))
+    else:
+        asyncio.run(normalize_media(args))
 
 
 if __name__ == "__main__":
@@ -2,27 +2,131 @@ import os
 import json
 import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, Any, List, Optional, Tuple
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
+from google.oauth2 import service_account
+from requests.adapters import HTTPAdapter
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
 from google.cloud import firestore
+from google.api_core.exceptions import ServerError, TooManyRequests
+from google.api_core.retry import Retry, if_transient_error
+
+try:
+    from gcloud.aio.storage import Storage as AioStorage
+except ImportError:
+    AioStorage = None
+
+# Chunk sizes for resumable transfers; GCS requires multiples of 256 KiB
+GCS_CHUNK_ALIGNMENT = 256 * 1024
+DEFAULT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_DOWNLOAD_CHUNK_SIZE = 1536 * 1024
+
+# Largest file uploaded through gcloud-aio-storage, which reads the whole file into
+# memory in one request; bigger files use the chunked resumable upload instead
+AIO_UPLOAD_LIMIT = 32 * 1024 * 1024
+
+# Timeout in seconds for a single in-memory gcloud-aio-storage upload
+AIO_UPLOAD_TIMEOUT = 300
+
+# Connections kept open by the shared storage HTTP session
+HTTP_POOL_SIZE = 64
+
+# Part size and worker count for concurrent uploads of a single large file
+PARALLEL_CHUNK_SIZE = 32 * 1024 * 1024
+DEFAULT_TRANSFER_WORKERS = 8
+
+# Listing page size and the only fields requested for each blob
+LIST_PAGE_SIZE = 1000
+LIST_FIELDS = 'items(name,size,updated),nextPageToken'
+
+# Maximum number of calls grouped into one JSON API batch request
+GCS_BATCH_SIZE = 100
+
+# Maximum number of writes in one Firestore batch commit
+FIRESTORE_BATCH_SIZE = 500
+
+# Size and lifetime in seconds of the job read cache
+JOB_CACHE_SIZE = 1024
+JOB_CACHE_TTL = 5.0
+
+# Native retry for calls made through the Google client libraries
+CLIENT_RETRY = Retry(predicate=if_transient_error, initial=1.0, maximum=8.0, multiplier=2.0, deadline=60.0)
+
+# Attempts for calls retried on the event loop; waits back off for 2**attempt seconds
+RETRY_ATTEMPTS = 3
+
+def _is_transient(error: Exception) -> bool:
+    """Check whether an error is worth retrying."""
+    if isinstance(error, (ServerError, TooManyRequests)):
+        return True
+    # aiohttp response errors carry the HTTP status
+    status = getattr(error, 'status', None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+async def _with_retry(coro_factory, attempts: int = RETRY_ATTEMPTS):
+    """Await a coroutine, retrying transient failures with exponential backoff.
+    
+    Args:
+        coro_factory: Callable returning a fresh coroutine for each attempt
+        attempts: Maximum number of attempts
+        
+    Returns:
+        Result of the first successful attempt
+    """
+    for attempt in range(attempts):
+        try:
+            return await coro_factory()
+        except Exception as e:
+            if attempt == attempts - 1 or not _is_transient(e):
+                raise
+            logging.warning(f"Transient error, retrying in {2 ** attempt}s: {e}")
+            await asyncio.sleep(2 ** attempt)
 
 class CloudStorageManager:
     """Manages Google Cloud Storage operations for media files."""
     
-    def __init__(self, bucket_name: str, credentials_path: Optional[str] = None):
+    def __init__(self, bucket_name: str, credentials_path: Optional[str] = None,
+                 upload_chunk_size: int = DEFAULT_UPLOAD_CHUNK_SIZE,
+                 download_chunk_size: int = DEFAULT_DOWNLOAD_CHUNK_SIZE):
         """Initialize the Cloud Storage manager.
         
         Args:
             bucket_name: Name of the GCS bucket to use
             credentials_path: Path to GCP credentials JSON file. If None, uses application default credentials.
+            upload_chunk_size: Chunk size in bytes for resumable uploads
+            download_chunk_size: Chunk size in bytes for chunked downloads
         """
+        for chunk_size in (upload_chunk_size, download_chunk_size):
+            if chunk_size <= 0 or chunk_size % GCS_CHUNK_ALIGNMENT:
+                raise ValueError(f"Chunk size must be a positive multiple of {GCS_CHUNK_ALIGNMENT} bytes")
+        
         self.bucket_name = bucket_name
+        self.upload_chunk_size = upload_chunk_size
+        self.download_chunk_size = download_chunk_size
+        self.credentials_path = credentials_path
+        
+        # Native asyncio client, created on first use inside the running loop
+        self._aio_storage = None
         
         if credentials_path:
-            self.storage_client = storage.Client.from_service_account_json(credentials_path)
+            credentials = service_account.Credentials.from_service_account_file(
+                credentials_path, scopes=storage.Client.SCOPE
+            )
+            project = credentials.project_id
         else:
-            self.storage_client = storage.Client()
-            
+            credentials, project = google.auth.default(scopes=storage.Client.SCOPE)
+        
+        # Share one pooled, authorized session so executor threads reuse TLS connections
+        session = AuthorizedSession(credentials)
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount('https://', adapter)
+        
+        self.storage_client = storage.Client(project=project, credentials=credentials, _http=session)
         self.bucket = self.storage_client.bucket(bucket_name)
     
     async def upload_file(self, source_path: str, destination_blob_name: str) -> str:
@@ -35,16 +139,25 @@ class CloudStorageManager:
         Returns:
             Public URL of the uploaded file
         """
-        # Create a blob object for the destination
-        blob = self.bucket.blob(destination_blob_name)
-        
-        # Run the upload in a thread pool to avoid blocking
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, lambda: blob.upload_from_filename(source_path))
-        
-        # Make the blob publicly accessible
-        blob.make_public()
+        # Create a blob object for the destination, uploaded in resumable chunks
+        blob = self.bucket.blob(destination_blob_name, chunk_size=self.upload_chunk_size)
+        
+        if AioStorage is not None and os.path.getsize(source_path) <= AIO_UPLOAD_LIMIT:
+            # Upload small files on the event loop without handing off to a thread
+            aio_storage = self._get_aio_storage()
+            await _with_retry(lambda: aio_storage.upload_from_filename(
+                self.bucket_name, destination_blob_name, source_path, timeout=AIO_UPLOAD_TIMEOUT
+            ))
+        else:
+            def upload():
+                with open(source_path, 'rb') as f:
+                    blob.upload_from_file(f, rewind=True, retry=CLIENT_RETRY)
+            
+            # Run the upload in a thread pool to avoid blocking
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, upload)
         
+        # Access is granted by bucket-level IAM or signed URLs, not per-object ACLs
         return blob.public_url
     
     async def download_file(self, source_blob_name: str, destination_path: str) -> str:
@@ -57,15 +170,143 @@ class CloudStorageManager:
         Returns:
             Path to the downloaded file
         """
-        # Create a blob object for the source
-        blob = self.bucket.blob(source_blob_name)
+        # Always stream to disk in chunks: the object size isn't known up front and
+        # gcloud-aio-storage would buffer the whole download in memory
+        blob = self.bucket.blob(source_blob_name, chunk_size=self.download_chunk_size)
         
         # Run the download in a thread pool to avoid blocking
         loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, lambda: blob.download_to_filename(destination_path))
+        await loop.run_in_executor(None, lambda: blob.download_to_filename(destination_path, retry=CLIENT_RETRY))
         
         return destination_path
     
+    def _get_aio_storage(self):
+        """Return the shared asyncio storage client, creating it on first use."""
+        if self._aio_storage is None:
+            self._aio_storage = AioStorage(service_file=self.credentials_path)
+        return self._aio_storage
+    
+    async def close(self) -> None:
+        """Close the asyncio storage client and its HTTP session."""
+        if self._aio_storage is not None:
+            await self._aio_storage.close()
+            self._aio_storage = None
+    
+    async def upload_many(self, paths_and_names: List[Tuple[str, str]],
+                          workers: int = DEFAULT_TRANSFER_WORKERS,
+                          worker_type: str = transfer_manager.THREAD) -> List[str]:
+        """Upload several files in parallel.
+        
+        Args:
+            paths_and_names: Pairs of local file path and destination blob name
+            workers: Number of transfer workers
+            worker_type: transfer_manager.THREAD or transfer_manager.PROCESS
+            
+        Returns:
+            Public URLs of the uploaded files, in input order
+        """
+        pairs = [
+            (path, self.bucket.blob(name, chunk_size=self.upload_chunk_size))
+            for path, name in paths_and_names
+        ]
+        
+        # Run the transfer manager in a thread pool to avoid blocking
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, lambda: transfer_manager.upload_many(
+            pairs,
+            max_workers=workers,
+            worker_type=worker_type,
+            raise_exception=True
+        ))
+        
+        return [blob.public_url for _, blob in pairs]
+    
+    async def download_many(self, names_and_paths: List[Tuple[str, str]],
+                            workers: int = DEFAULT_TRANSFER_WORKERS,
+                            worker_type: str = transfer_manager.THREAD) -> List[str]:
+        """Download several files in parallel.
+        
+        Args:
+            names_and_paths: Pairs of source blob name and local destination path
+            workers: Number of transfer workers
+            worker_type: transfer_manager.THREAD or transfer_manager.PROCESS
+            
+        Returns:
+            Paths to the downloaded files, in input order
+        """
+        pairs = [
+            (self.bucket.blob(name, chunk_size=self.download_chunk_size), path)
+            for name, path in names_and_paths
+        ]
+        
+        # Run the transfer manager in a thread pool to avoid blocking
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, lambda: transfer_manager.download_many(
+            pairs,
+            max_workers=workers,
+            worker_type=worker_type,
+            raise_exception=True
+        ))
+        
+        return [path for _, path in pairs]
+    
+    async def upload_large_file(self, source_path: str, destination_blob_name: str,
+                                chunk_size: int = PARALLEL_CHUNK_SIZE,
+                                workers: int = DEFAULT_TRANSFER_WORKERS,
+                                worker_type: str = transfer_manager.THREAD) -> str:
+        """Upload a single large file as concurrently uploaded parts.
+        
+        Args:
+            source_path: Path to the local file to upload
+            destination_blob_name: Name of the destination blob in GCS
+            chunk_size: Size in bytes of each uploaded part
+            workers: Number of transfer workers
+            worker_type: transfer_manager.THREAD or transfer_manager.PROCESS
+            
+        Returns:
+            Public URL of the uploaded file
+        """
+        blob = self.bucket.blob(destination_blob_name)
+        
+        # Run the transfer manager in a thread pool to avoid blocking
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, lambda: transfer_manager.upload_chunks_concurrently(
+            source_path,
+            blob,
+            chunk_size=chunk_size,
+            max_workers=workers,
+            worker_type=worker_type
+        ))
+        
+        return blob.public_url
+    
+    def public_url(self, blob_name: str) -> str:
+        """Return the public URL of a blob in a bucket that is readable via IAM.
+        
+        Args:
+            blob_name: Name of the blob in GCS
+            
+        Returns:
+            Public HTTPS URL for the blob
+        """
+        return f"https://storage.googleapis.com/{self.bucket_name}/{blob_name}"
+    
+    def signed_url(self, blob_name: str, ttl: int = 3600) -> str:
+        """Generate a V4 signed URL granting temporary read access to a blob.
+        
+        Signing happens locally, so this does not make a network request.
+        
+        Args:
+            blob_name: Name of the blob in GCS
+            ttl: Lifetime of the URL in seconds
+            
+        Returns:
+            Signed HTTPS URL for the blob
+        """
+        return self.bucket.blob(blob_name).generate_signed_url(
+            expiration=timedelta(seconds=ttl), version="v4"
+        )
+    
     async def list_files(self, prefix: Optional[str] = None) -> List[Dict[str, Any]]:
         """List files in the GCS bucket with an optional prefix.
         
@@ -75,7 +316,25 @@ class CloudStorageManager:
         Returns:
             List of blob information dictionaries
         """
-        blobs = self.bucket.list_blobs(prefix=prefix)
+        # Run the paged listing in a thread pool to avoid blocking
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._list_blobs, prefix)
+    
+    async def list_files_sharded(self, prefixes: List[str]) -> List[Dict[str, Any]]:
+        """List files under several prefixes concurrently.
+        
+        Args:
+            prefixes: Non-overlapping prefixes that together cover the listing
+            
+        Returns:
+            List of blob information dictionaries across all prefixes
+        """
+        shards = await asyncio.gather(*(self.list_files(prefix) for prefix in prefixes))
+        return [item for shard in shards for item in shard]
+    
+    def _list_blobs(self, prefix: Optional[str]) -> List[Dict[str, Any]]:
+        """List blobs under a prefix, fetching only the fields that are returned."""
+        blobs = self.bucket.list_blobs(prefix=prefix, fields=LIST_FIELDS, page_size=LIST_PAGE_SIZE)
         
         result = []
         for blob in blobs:
@@ -103,11 +362,36 @@ class CloudStorageManager:
         # Run the deletion in a thread pool to avoid blocking
         try:
             loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, blob.delete)
+            await loop.run_in_executor(None, lambda: blob.delete(retry=CLIENT_RETRY))
             return True
         except Exception as e:
             logging.error(f"Error deleting blob {blob_name}: {e}")
             return False
+    
+    async def delete_many(self, blob_names: List[str]) -> bool:
+        """Delete several files using batched JSON API requests.
+        
+        Args:
+            blob_names: Names of the blobs to delete
+            
+        Returns:
+            True if all deletions were successful, False otherwise
+        """
+        def delete_batches():
+            for start in range(0, len(blob_names), GCS_BATCH_SIZE):
+                # Deletions inside the batch context are sent as one HTTP request
+                with self.storage_client.batch():
+                    for blob_name in blob_names[start:start + GCS_BATCH_SIZE]:
+                        self.bucket.blob(blob_name).delete()
+        
+        # Run the deletion in a thread pool to avoid blocking
+        try:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, delete_batches)
+            return True
+        except Exception as e:
+            logging.error(f"Error deleting blobs: {e}")
+            return False
 
 class FirestoreManager:
     """Manages Firestore operations for job metadata and tracking."""
@@ -125,6 +409,9 @@ class FirestoreManager:
             self.db = firestore.Client.from_service_account_json(credentials_path)
         else:
             self.db = firestore.Client()
+        
+        # Short-lived cache of job reads: job_id -> (expiry, job data)
+        self._job_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
     
     async def create_job(self, job_data: Dict[str, Any]) -> str:
         """Create a new normalization job in Firestore.
@@ -148,10 +435,41 @@ class FirestoreManager:
         
         # Run the set operation in a thread pool to avoid blocking
         loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, lambda: doc_ref.set(job_data))
+        await loop.run_in_executor(None, lambda: doc_ref.set(job_data, retry=CLIENT_RETRY))
         
         return doc_ref.id
     
+    async def create_jobs_bulk(self, jobs: List[Dict[str, Any]]) -> List[str]:
+        """Create several normalization jobs with batched writes.
+        
+        Args:
+            jobs: List of dictionaries containing job data
+            
+        Returns:
+            IDs of the created job documents, in input order
+        """
+        collection = self.db.collection(self.collection_name)
+        doc_refs = []
+        batches = []
+        
+        for start in range(0, len(jobs), FIRESTORE_BATCH_SIZE):
+            batch = self.db.batch()
+            for job_data in jobs[start:start + FIRESTORE_BATCH_SIZE]:
+                # Apply the same defaults as create_job
+                job_data.setdefault('created_at', firestore.SERVER_TIMESTAMP)
+                job_data.setdefault('status', 'pending')
+                
+                doc_ref = collection.document()
+                batch.set(doc_ref, job_data)
+                doc_refs.append(doc_ref)
+            batches.append(batch)
+        
+        # Commit each batch as a single RPC in a thread pool to avoid blocking
+        loop = asyncio.get_event_loop()
+        await asyncio.gather(*(loop.run_in_executor(None, lambda b=batch: b.commit(retry=CLIENT_RETRY)) for batch in batches))
+        
+        return [doc_ref.id for doc_ref in doc_refs]
+    
     async def update_job(self, job_id: str, update_data: Dict[str, Any]) -> bool:
         """Update an existing normalization job in Firestore.
         
@@ -167,11 +485,12 @@ class FirestoreManager:
         
         # Get the document reference
         doc_ref = self.db.collection(self.collection_name).document(job_id)
+        self._job_cache.pop(job_id, None)
         
         # Run the update operation in a thread pool to avoid blocking
         try:
             loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, lambda: doc_ref.update(update_data))
+            await loop.run_in_executor(None, lambda: doc_ref.update(update_data, retry=CLIENT_RETRY))
             return True
         except Exception as e:
             logging.error(f"Error updating job {job_id}: {e}")
@@ -186,15 +505,27 @@ class FirestoreManager:
         Returns:
             Dictionary containing job data, or None if not found
         """
+        # Serve recent reads from the cache
+        cached = self._job_cache.get(job_id)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self._job_cache.move_to_end(job_id)
+                return dict(cached[1])
+            del self._job_cache[job_id]
+        
         # Get the document reference
         doc_ref = self.db.collection(self.collection_name).document(job_id)
         
         # Run the get operation in a thread pool to avoid blocking
         loop = asyncio.get_event_loop()
-        doc = await loop.run_in_executor(None, doc_ref.get)
+        doc = await loop.run_in_executor(None, lambda: doc_ref.get(retry=CLIENT_RETRY))
         
         if doc.exists:
-            return doc.to_dict()
+            job_data = doc.to_dict()
+            self._job_cache[job_id] = (time.monotonic() + JOB_CACHE_TTL, job_data)
+            if len(self._job_cache) > JOB_CACHE_SIZE:
+                self._job_cache.popitem(last=False)
+            return dict(job_data)
         else:
             return None
     
@@ -243,11 +574,12 @@ class FirestoreManager:
         """
         # Get the document reference
         doc_ref = self.db.collection(self.collection_name).document(job_id)
+        self._job_cache.pop(job_id, None)
         
         # Run the delete operation in a thread pool to avoid blocking
         try:
             loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, doc_ref.delete)
+            await loop.run_in_executor(None, lambda: doc_ref.delete(retry=CLIENT_RETRY))
             return True
         except Exception as e:
             logging.error(f"Error deleting job {job_id}: {e}")
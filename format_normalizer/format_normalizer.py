@@ -5,33 +5,220 @@ Python tool for normalizing media formats using FFmpeg with Gemini AI support.
 """
 import ffmpeg
 import os
+import asyncio
+import functools
+import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .normalizer import _HW_TEST_INPUT
+
+# Keys written by ffmpeg's -progress output
+PROGRESS_KEYS = frozenset((
+    'frame', 'fps', 'bitrate', 'total_size', 'out_time_us', 'out_time_ms', 'out_time',
+    'dup_frames', 'drop_frames', 'speed', 'progress'
+))
+
+# Chunk size for resumable uploads of piped output; GCS requires multiples of 256 KiB
+STREAM_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Containers that need fragmenting to be written to a non-seekable pipe
+FRAGMENTED_FORMATS = frozenset(('mp4', 'mov', 'm4a'))
+
+# Hardware encoders to try for each codec, in order of preference
+HW_ENCODERS = {
+    'h264': ('h264_nvenc', 'h264_qsv', 'h264_videotoolbox'),
+    'h265': ('hevc_nvenc', 'hevc_qsv', 'hevc_videotoolbox'),
+    'hevc': ('hevc_nvenc', 'hevc_qsv', 'hevc_videotoolbox'),
+    'vp9': ('vp9_qsv',),
+}
+
+# Encoder presets for hardware encoders that take one
+HW_PRESETS = {'nvenc': 'p4', 'qsv': 'medium'}
+
+
+def _encoder_works(encoder):
+    # Being built in does not mean the device is present, so encode one test frame
+    try:
+        return subprocess.run(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', *_HW_TEST_INPUT, '-c:v', encoder, '-f', 'null', '-'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ).returncode == 0
+    except OSError:
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def _working_hw_encoders():
+    try:
+        out = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True, check=True
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return {}
+    # Encoder lines look like " V....D h264_nvenc   NVIDIA NVENC H.264 encoder"
+    available = {parts[1] for parts in map(str.split, out.splitlines()) if len(parts) > 1}
+    working = {}
+    hw_encoders = {}
+    for codec, candidates in HW_ENCODERS.items():
+        for encoder in candidates:
+            if encoder not in available:
+                continue
+            if encoder not in working:
+                working[encoder] = _encoder_works(encoder)
+            if working[encoder]:
+                hw_encoders[codec] = encoder
+                break
+    return hw_encoders
+
+
+def _hw_encoder(codec):
+    return _working_hw_encoders().get(codec)
+
+
+@functools.lru_cache(maxsize=256)
+def _probe_cached(path, mtime_ns, size):
+    # Probe output depends only on file content, so (path, mtime, size) is a safe key
+    return ffmpeg.probe(path)
+
+
+def _target_path(path, target_format):
+    stem, dot, ext = path.rpartition('.')
+    # Only the rare ambiguous names (no extension, dot in a directory, dotfiles) need splitext
+    if not dot or '/' in ext or not stem or stem.endswith('/'):
+        stem = os.path.splitext(path)[0]
+    return f"{stem}.{target_format}"
+
+
+def _convert_one(job):
+    # Runs in a worker process; the AI integration is not needed for conversion
+    source_path, target_path, target_format, kwargs = job
+    return FormatNormalizer().convert(source_path, target_path, target_format, **kwargs)
+
 
 class FormatNormalizer:
     def __init__(self, ai_integration=None):
         self.ai = ai_integration
-    
-    def convert(self, source_path, target_path, target_format, codec=None, preset='web', options=None):
-        try:
-            input_stream = ffmpeg.input(source_path)
-            output_params = {}
+
+    def probe(self, path):
+        st = os.stat(path)
+        return _probe_cached(path, st.st_mtime_ns, st.st_size)
+
+    def _build_output(self, source_path, target_path, codec=None, preset='web', threads=None, hwaccel=False,
+                      **extra_params):
+        encoder = _hw_encoder(codec) if codec and hwaccel else None
+        input_stream = ffmpeg.input(source_path, hwaccel='auto') if encoder else ffmpeg.input(source_path)
+        output_params = {}
+        if encoder:
+            output_params['c:v'] = encoder
+            hw_preset = HW_PRESETS.get(encoder.rsplit('_', 1)[1])
+            if hw_preset:
+                output_params['preset'] = hw_preset
+        else:
             if codec:
                 output_params['c:v'] = codec
             if preset:
                 output_params['preset'] = preset
-            ffmpeg.output(input_stream, target_path, **output_params).run()
+        if threads:
+            output_params['threads'] = threads
+        output_params.update(extra_params)
+        return ffmpeg.output(input_stream, target_path, **output_params)
+
+    def convert(self, source_path, target_path, target_format, codec=None, preset='web', options=None,
+                threads=None, hwaccel=False):
+        try:
+            self._build_output(source_path, target_path, codec, preset, threads, hwaccel).run()
+            return {'success': True, 'output': target_path}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    async def convert_async(self, source_path, target_path, target_format, codec=None, preset='web',
+                            options=None, progress_callback=None, threads=None, hwaccel=False):
+        try:
+            stream = self._build_output(source_path, target_path, codec, preset, threads, hwaccel)
+            cmd = ffmpeg.compile(stream.global_args('-progress', 'pipe:2', '-nostats'), overwrite_output=True)
+            duration_us = None
+            if progress_callback:
+                probe = await asyncio.get_running_loop().run_in_executor(None, self.probe, source_path)
+                duration = probe.get('format', {}).get('duration')
+                duration_us = float(duration) * 1_000_000 if duration else None
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+            )
+            # Progress lines are consumed as they arrive; only the log tail is kept for errors
+            log_tail = deque(maxlen=20)
+            try:
+                async for raw in proc.stderr:
+                    line = raw.decode(errors='replace').strip()
+                    key, sep, value = line.partition('=')
+                    if not sep or key not in PROGRESS_KEYS:
+                        log_tail.append(line)
+                    elif key == 'out_time_us' and duration_us and value.isdigit():
+                        progress_callback(min(100.0, int(value) * 100 / duration_us))
+                returncode = await proc.wait()
+            except BaseException:
+                # Cancelled or the callback raised: don't leave ffmpeg writing a partial output
+                if proc.returncode is None:
+                    proc.kill()
+                    await proc.wait()
+                raise
+            if returncode != 0:
+                return {'success': False, 'error': '\n'.join(log_tail)}
+            if progress_callback:
+                progress_callback(100.0)
             return {'success': True, 'output': target_path}
         except Exception as e:
             return {'success': False, 'error': str(e)}
-    
+
+    def convert_to_gcs(self, source_path, blob, target_format, codec=None, preset='web', threads=None, hwaccel=False):
+        # Upload ffmpeg's stdout as it is produced instead of writing and re-reading a local file
+        extra_params = {'format': target_format}
+        if target_format in FRAGMENTED_FORMATS:
+            extra_params['movflags'] = 'frag_keyframe+empty_moov'
+        proc = None
+        try:
+            stream = self._build_output(source_path, 'pipe:', codec, preset, threads, hwaccel, **extra_params)
+            proc = stream.run_async(pipe_stdout=True)
+            blob.chunk_size = blob.chunk_size or STREAM_CHUNK_SIZE
+            blob.upload_from_file(proc.stdout, rewind=False)
+            if proc.wait() != 0:
+                # The upload finished on EOF even though the encode failed
+                blob.delete()
+                return {'success': False, 'error': f'ffmpeg exited with code {proc.returncode}'}
+            return {'success': True, 'output': f'gs://{blob.bucket.name}/{blob.name}'}
+        except Exception as e:
+            if proc and proc.poll() is None:
+                proc.kill()
+            return {'success': False, 'error': str(e)}
+
     def analyze_content(self, file_path):
         if self.ai:
             return self.ai.analyze(file_path)
         return {'ai': 'not enabled'}
-    
-    def batch_convert(self, files, target_format, **kwargs):
-        results = []
-        for file in files:
-            target_path = f"{os.path.splitext(file)[0]}.{target_format}"
-            result = self.convert(file, target_path, target_format, **kwargs)
-            results.append(result)
-        return results
+
+    def batch_convert(self, files, target_format, max_workers=None, concurrency='process', **kwargs):
+        cpus = os.cpu_count() or 1
+        max_workers = max_workers or cpus
+        # Split the cores between concurrent ffmpeg processes instead of oversubscribing
+        kwargs.setdefault('threads', max(1, cpus // max_workers))
+        jobs = [
+            (file, _target_path(file, target_format), target_format, kwargs)
+            for file in files
+        ]
+        if concurrency == 'asyncio':
+            return asyncio.run(self._batch_convert_async(jobs, max_workers))
+        if concurrency != 'process':
+            raise ValueError(f"Unknown concurrency mode: {concurrency}")
+        # Each conversion is an independent ffmpeg process, so fan out across cores
+        with ProcessPoolExecutor(max_workers=max_workers) as ex:
+            return list(ex.map(_convert_one, jobs))
+
+    async def _batch_convert_async(self, jobs, max_workers):
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def run(job):
+            source_path, target_path, target_format, kwargs = job
+            async with semaphore:
+                return await self.convert_async(source_path, target_path, target_format, **kwargs)
+
+        return await asyncio.gather(*(run(job) for job in jobs))
@@ -1,229 +1,776 @@
 import os
+import re
+import copy
 import json
+import time
+import asyncio
+import hashlib
+import logging
 import google.generativeai as genai
+from types import MappingProxyType
+from collections import OrderedDict
 from typing import Dict, Any, List, Optional, Tuple
 
+from .ai_analyzer import _configure_genai
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _dumps(value: Any) -> str:
+        """Serialize a prompt payload with indented, sorted keys."""
+        return orjson.dumps(
+            value, default=str,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        ).decode()
+
+    def _dumps_bytes(value: Any) -> bytes:
+        """Serialize a cached result compactly."""
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    _json_loads = json.loads
+
+    def _dumps(value: Any) -> str:
+        """Serialize a prompt payload with indented, sorted keys."""
+        return json.dumps(value, indent=2, sort_keys=True, default=str)
+
+    def _dumps_bytes(value: Any) -> bytes:
+        """Serialize a cached result compactly."""
+        return json.dumps(value, separators=(',', ':'), default=str).encode('utf-8')
+
+try:
+    import aiosqlite
+except ImportError:
+    aiosqlite = None
+
+logger = logging.getLogger(__name__)
+
+# Default models: the fast tier serves routine checks, the pro tier parameter recommendations
+FAST_MODEL_NAME = 'gemini-1.5-flash'
+PRO_MODEL_NAME = 'gemini-1.5-pro'
+
+# Ask for bare JSON, capped and near-deterministic, instead of prose around an object
+GENERATION_CONFIG = {
+    'response_mime_type': 'application/json',
+    'max_output_tokens': 2048,
+    'temperature': 0.1,
+}
+
+# Maximum number of cached analyses and how long each stays valid, in seconds
+ANALYSIS_CACHE_SIZE = 1024
+ANALYSIS_CACHE_TTL = 7 * 24 * 60 * 60
+
+# Seconds between sweeps of expired rows from the disk cache
+DISK_CACHE_PURGE_INTERVAL = 60 * 60
+
+# Shared decoder used to extract a single JSON object from free-form responses
+_JSON_DECODER = json.JSONDecoder()
+
+# Matches a JSON object inside a fenced code block
+_JSON_FENCE_RE = re.compile(r'```(?:json)?\s*(\{.*\})\s*```', re.DOTALL)
+
+# Maximum number of Gemini requests in flight per analyzer, to stay clear of 429s
+MAX_CONCURRENT_REQUESTS = 5
+
+# Fields compared to detect a passthrough conversion
+_PASSTHROUGH_KEYS = ('format', 'codec', 'resolution', 'framerate')
+
+# Compatibility scores for common (source format, source codec, target format, target codec) pairs
+_KNOWN_COMPAT = {
+    ('mov', 'h264', 'mp4', 'h264'): 95,
+    ('mkv', 'h264', 'mp4', 'h264'): 95,
+    ('mp4', 'h264', 'mov', 'h264'): 95,
+    ('mp4', 'h264', 'mkv', 'h264'): 95,
+    ('mov', 'prores', 'mov', 'h264'): 75,
+    ('mov', 'prores', 'mp4', 'h264'): 75,
+    ('mov', 'prores', 'mp4', 'h265'): 78,
+    ('mp4', 'h264', 'mov', 'prores'): 90,
+    ('mp4', 'h264', 'mp4', 'h265'): 85,
+    ('mp4', 'h265', 'mp4', 'h264'): 85,
+    ('mp4', 'h264', 'webm', 'vp9'): 80,
+    ('mp4', 'h264', 'mp4', 'av1'): 82,
+}
+
+# Metadata fields sent to Gemini; tags, dispositions and side data only add prompt tokens.
+# Covers both ffprobe's field names and the simplified ones used in format descriptions.
+_ESSENTIAL_KEYS = frozenset({
+    'format', 'streams', 'video', 'audio', 'codec', 'codec_name', 'codec_type', 'profile', 'level',
+    'width', 'height', 'resolution', 'framerate', 'r_frame_rate', 'avg_frame_rate', 'bitrate', 'bit_rate',
+    'pixel_format', 'pix_fmt', 'sample_rate', 'channels', 'channel_layout', 'duration',
+    'color_space', 'color_transfer', 'color_primaries', 'format_name', 'nb_streams', 'size',
+})
+
+# Metadata fields holding timestamps, which ffprobe reports as strings
+_TIMESTAMP_KEYS = frozenset({'duration'})
+
+
+def _slim(value: Any) -> Any:
+    """Keep only essential metadata fields, with floats and timestamps rounded to the millisecond."""
+    if isinstance(value, dict):
+        slim = {}
+        for key, item in value.items():
+            if key not in _ESSENTIAL_KEYS:
+                continue
+            if key in _TIMESTAMP_KEYS and isinstance(item, str):
+                try:
+                    item = float(item)
+                except ValueError:
+                    pass
+            slim[key] = _slim(item)
+        return slim
+    if isinstance(value, list):
+        return [_slim(item) for item in value]
+    if isinstance(value, float):
+        return round(value, 3)
+    return value
+
+# Quality tiers of the fallback parameters; any other preset is treated as medium
+_FALLBACK_PRESETS = ('high', 'medium', 'low')
+
+
+def _build_fallback_table():
+    """Materialize the fallback video parameters for every (format, codec, preset tier)."""
+    crf = {
+        'h264': {'high': 18, 'medium': 23, 'low': 28},
+        'h265': {'high': 22, 'medium': 28, 'low': 32},
+    }
+    families = (
+        (('mp4', 'mov', 'mkv'), ('h264', 'libx264'), lambda preset: (
+            {"preset": preset, "profile": "high", "level": "4.1", "pixel_format": "yuv420p"},
+            {"type": "CRF", "value": crf['h264'][preset]},
+            ("-movflags", "+faststart"),
+        )),
+        (('mp4', 'mov', 'mkv'), ('h265', 'hevc', 'libx265'), lambda preset: (
+            {"preset": preset, "profile": "main", "pixel_format": "yuv420p"},
+            {"type": "CRF", "value": crf['h265'][preset]},
+            (),
+        )),
+        (('mp4', 'mov'), ('prores', 'prores_ks'), lambda preset: (
+            {"profile": "3" if preset == 'high' else "2", "vendor": "apl0"},  # 3=HQ, 2=Standard
+            {"type": "CBR", "value": "45000k" if preset == 'high' else "30000k"},
+            (),
+        )),
+    )
+    table = {}
+    for formats, codecs, build in families:
+        for preset in _FALLBACK_PRESETS:
+            codec_parameters, bitrate_strategy, ffmpeg_parameters = build(preset)
+            entry = (MappingProxyType(codec_parameters), MappingProxyType(bitrate_strategy), ffmpeg_parameters)
+            for format_type in formats:
+                for codec in codecs:
+                    # Earlier families win, matching the order of the original checks
+                    table.setdefault((format_type, codec, preset), entry)
+    return MappingProxyType(table)
+
+
+# Fallback video parameters keyed by (format, codec, preset tier)
+_FALLBACK_TABLE = _build_fallback_table()
+
+# Fallback video parameters for combinations without an entry
+_DEFAULT_FALLBACK = (MappingProxyType({}), MappingProxyType({}), ())
+
+# Fallback audio parameters keyed by (audio codec, preset tier)
+_FALLBACK_AUDIO_TABLE = MappingProxyType({
+    (audio_codec, preset): MappingProxyType({"codec": encoder, "bitrate": bitrates[preset == 'high']})
+    for audio_codec, encoder, bitrates in (('aac', 'aac', ('128k', '192k')), ('mp3', 'libmp3lame', ('192k', '320k')))
+    for preset in _FALLBACK_PRESETS
+})
+
+class _DiskCache:
+    """SQLite-backed analysis cache shared across processes and restarts."""
+    
+    def __init__(self, path: str):
+        """Initialize the disk cache.
+        
+        Args:
+            path: Path to the SQLite database file
+        """
+        self.path = path
+        self._db = None
+        self._connect_lock = asyncio.Lock()
+        self._purge_task = None
+    
+    async def _connect(self):
+        """Open the database and start the expiry sweep on first use."""
+        async with self._connect_lock:
+            if self._db is None:
+                db = await aiosqlite.connect(self.path)
+                await db.execute(
+                    "CREATE TABLE IF NOT EXISTS cache "
+                    "(hash TEXT PRIMARY KEY, response BLOB, created REAL, expires REAL)"
+                )
+                await db.commit()
+                self._db = db
+                self._purge_task = asyncio.create_task(self._purge_expired())
+        return self._db
+    
+    async def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Return an unexpired cached result, or None."""
+        db = await self._connect()
+        async with db.execute(
+            "SELECT response FROM cache WHERE hash = ? AND expires > ?", (cache_key, time.time())
+        ) as cursor:
+            row = await cursor.fetchone()
+        return _json_loads(row[0]) if row else None
+    
+    async def put(self, cache_key: str, result: Dict[str, Any], ttl: float) -> None:
+        """Store a result that expires after ttl seconds."""
+        db = await self._connect()
+        now = time.time()
+        await db.execute(
+            "INSERT OR REPLACE INTO cache (hash, response, created, expires) VALUES (?, ?, ?, ?)",
+            (cache_key, _dumps_bytes(result), now, now + ttl)
+        )
+        await db.commit()
+    
+    async def _purge_expired(self) -> None:
+        """Periodically delete expired rows."""
+        while True:
+            await asyncio.sleep(DISK_CACHE_PURGE_INTERVAL)
+            try:
+                await self._db.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+                await self._db.commit()
+            except Exception as e:
+                logger.error("Error purging Gemini disk cache: %s", e)
+
+# One disk cache per database file, shared by every analyzer in the process
+_DISK_CACHES: Dict[str, _DiskCache] = {}
+
+def _get_disk_cache(path: str) -> _DiskCache:
+    """Return the shared disk cache for a database file."""
+    if path not in _DISK_CACHES:
+        _DISK_CACHES[path] = _DiskCache(path)
+    return _DISK_CACHES[path]
+
+# Static scaffold for the format compatibility prompt, filled in per request
+_COMPATIBILITY_PROMPT_TEMPLATE = """You are an expert in media format conversion and compatibility. Analyze the compatibility
+between the following source and target formats and provide detailed recommendations for conversion.
+
+Source Format:
+```json
+{source_format}
+```
+
+Target Format:
+```json
+{target_format}
+```
+
+Provide a detailed analysis of:
+1. Compatibility issues between the formats
+2. Quality impact of the conversion
+3. Recommended conversion approach
+4. Any special considerations for this specific conversion
+
+Return your analysis as a valid JSON object with the following structure:
+```json
+{{
+  "compatibility_score": 0-100,
+  "issues": [],
+  "quality_impact": {{}},
+  "recommended_approach": {{}},
+  "special_considerations": []
+}}
+```
+
+Provide only the JSON response without any additional text.
+"""
+
+# Static scaffold for the conversion parameter prompt, filled in per request
+_PARAMETERS_PROMPT_TEMPLATE = """You are an expert in media encoding and optimization. Recommend optimal conversion parameters
+for the following media based on its content type and target format requirements.
+
+Media Metadata:
+```json
+{media_metadata}
+```
+
+Target Format:
+```json
+{target_format}
+```
+
+Content Type: {content_type}
+
+Based on the content type and technical requirements, recommend:
+1. Optimal codec-specific parameters
+2. Appropriate bitrate strategy and values
+3. Quality preservation techniques
+4. Content-specific optimizations
+5. FFmpeg command parameters
+
+Return your recommendations as a valid JSON object with the following structure:
+```json
+{{
+  "codec_parameters": {{}},
+  "bitrate_strategy": {{}},
+  "quality_preservation": {{}},
+  "content_optimizations": {{}},
+  "ffmpeg_parameters": []
+}}
+```
+
+Provide only the JSON response without any additional text.
+"""
+
+# Static scaffold for the output quality validation prompt, filled in per request
+_VALIDATION_PROMPT_TEMPLATE = """You are an expert in media quality assessment. Validate the quality of the converted media
+against the target requirements.
+
+Source Media Metadata:
+```json
+{source_metadata}
+```
+
+Output Media Metadata:
+```json
+{output_metadata}
+```
+
+Target Requirements:
+```json
+{target_requirements}
+```
+
+Perform a detailed quality assessment:
+1. Determine if the output meets all technical requirements
+2. Identify any quality issues or losses
+3. Evaluate the success of the conversion
+4. Suggest improvements if needed
+
+Return your validation as a valid JSON object with the following structure:
+```json
+{{
+  "passed": true/false,
+  "technical_compliance": {{}},
+  "quality_assessment": {{}},
+  "issues": [],
+  "improvements": []
+}}
+```
+
+Provide only the JSON response without any additional text.
+"""
+
 class GeminiFormatAnalyzer:
     """Integrates Gemini AI for media format analysis and optimization."""
     
-    def __init__(self, api_key: Optional[str] = None):
+    # Per-request fields that do not affect the analysis and are left out of cache keys
+    _IGNORED_KEYS = frozenset({'timestamp', 'request_id', 'trace_id', 'session_id'})
+    
+    # Fields whose string values are case-insensitive
+    _CASE_INSENSITIVE_KEYS = frozenset({'format', 'codec', 'preset'})
+    
+    def __init__(self, api_key: Optional[str] = None, fast_model: str = FAST_MODEL_NAME,
+                 pro_model: str = PRO_MODEL_NAME, cache_path: Optional[str] = None):
         """Initialize the Gemini Format Analyzer.
         
         Args:
             api_key: Gemini API key. If None, tries to get from GEMINI_API_KEY environment variable.
+            fast_model: Model used for compatibility analysis and output validation
+            pro_model: Model used for conversion parameter recommendations
+            cache_path: SQLite file for a persistent cache shared across processes. If None,
+                uses the GEMINI_CACHE_PATH environment variable; unset keeps the cache in memory only.
         """
         self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
         if not self.api_key:
             raise ValueError("Gemini API key must be provided or set as GEMINI_API_KEY environment variable")
         
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-pro')
+        # Reconfiguring the SDK drops its cached async client and pooled channel,
+        # so only configure when the key changes
+        _configure_genai(self.api_key)
+        self.fast_model_name = fast_model
+        self.pro_model_name = pro_model
+        # One model per tier, built once and shared by every request; per-call
+        # settings go to _generate rather than into a new model
+        self._models = {
+            name: genai.GenerativeModel(name, generation_config=GENERATION_CONFIG)
+            for name in (fast_model, pro_model)
+        }
+        self._fast_model = self._models[fast_model]
+        self._pro_model = self._models[pro_model]
+        self.model = self._pro_model
+        
+        # LRU cache of parsed analyses: content hash -> (expiry, result)
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        
+        # Optional persistent cache behind the in-memory one
+        cache_path = cache_path or os.environ.get('GEMINI_CACHE_PATH')
+        if cache_path and aiosqlite is None:
+            raise ImportError("aiosqlite is required for the persistent Gemini cache")
+        self._disk_cache = _get_disk_cache(cache_path) if cache_path else None
+        
+        # Gemini requests in flight, keyed like the cache, so identical calls share one
+        self._inflight: Dict[str, asyncio.Task] = {}
+        
+        # Limits concurrent Gemini requests across all calls on this analyzer
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
     
-    async def analyze_format_compatibility(self, source_format: Dict[str, Any], target_format: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze_format_compatibility(self, source_format: Dict[str, Any], target_format: Dict[str, Any],
+                                           override_model: Optional[str] = None) -> Dict[str, Any]:
         """Analyze compatibility between source and target formats.
         
         Args:
             source_format: Details of the source media format
             target_format: Details of the target media format
+            override_model: Configured model to use instead of the fast model
             
         Returns:
             Dict containing compatibility analysis and recommendations
         """
-        # Build prompt for format compatibility analysis
-        prompt = self._build_compatibility_prompt(source_format, target_format)
-        
-        # Get analysis from Gemini
-        response = await self.model.generate_content_async(prompt)
+        # Answer passthrough and well-known pairs locally
+        local_analysis = self._local_compatibility_analysis(source_format, target_format)
+        if local_analysis is not None:
+            return local_analysis
+        
+        # Serve repeated format pairs from the cache
+        model_name = self._select_model(override_model, self.fast_model_name)
+        cache_key = self._cache_key('compatibility', model_name, source_format, target_format)
+        cached = await self._cache_lookup(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Get analysis from Gemini, sharing the request with identical calls in flight
+        response_text = await self._request_once(
+            cache_key, model_name, lambda: self._build_compatibility_prompt(source_format, target_format)
+        )
         
         # Parse the analysis
         try:
-            compatibility_analysis = self._parse_analysis(response.text)
+            compatibility_analysis = self._parse_analysis(response_text)
+            await self._cache_store(cache_key, compatibility_analysis)
             return compatibility_analysis
         except Exception as e:
-            print(f"Error parsing Gemini format compatibility analysis: {e}")
+            logger.warning("Error parsing Gemini %s: %s", "format compatibility analysis", e)
             return self._get_fallback_compatibility_analysis(source_format, target_format)
     
-    async def recommend_conversion_parameters(self, media_metadata: Dict[str, Any], target_format: Dict[str, Any], content_type: str) -> Dict[str, Any]:
+    async def recommend_conversion_parameters(self, media_metadata: Dict[str, Any], target_format: Dict[str, Any], content_type: str,
+                                              override_model: Optional[str] = None) -> Dict[str, Any]:
         """Recommend optimal conversion parameters for specific content type.
         
         Args:
             media_metadata: Technical metadata about the source media
             target_format: Target format requirements
             content_type: Type of content (e.g., film, animation, sports)
+            override_model: Configured model to use instead of the pro model
             
         Returns:
             Dict containing recommended conversion parameters
         """
-        # Build prompt for parameter recommendations
-        prompt = self._build_parameters_prompt(media_metadata, target_format, content_type)
+        # Slim the metadata first so equivalent sources share cache entries and prompts stay small
+        slim_metadata = _slim(media_metadata)
+        
+        # Serve repeated requests from the cache
+        model_name = self._select_model(override_model, self.pro_model_name)
+        cache_key = self._cache_key('parameters', model_name, slim_metadata, target_format, content_type)
+        cached = await self._cache_lookup(cache_key)
+        if cached is not None:
+            return cached
         
-        # Get recommendations from Gemini
-        response = await self.model.generate_content_async(prompt)
+        # Get recommendations from Gemini, sharing the request with identical calls in flight
+        response_text = await self._request_once(
+            cache_key, model_name, lambda: self._build_parameters_prompt(slim_metadata, target_format, content_type)
+        )
         
         # Parse the recommendations
         try:
-            conversion_parameters = self._parse_analysis(response.text)
+            conversion_parameters = self._parse_analysis(response_text)
+            await self._cache_store(cache_key, conversion_parameters)
             return conversion_parameters
         except Exception as e:
-            print(f"Error parsing Gemini conversion parameter recommendations: {e}")
+            logger.warning("Error parsing Gemini %s: %s", "conversion parameter recommendations", e)
             return self._get_fallback_conversion_parameters(media_metadata, target_format)
     
     async def validate_output_quality(self, source_metadata: Dict[str, Any], output_metadata: Dict[str, Any], 
-                                    target_requirements: Dict[str, Any]) -> Tuple[bool, Dict[str, Any]]:
+                                    target_requirements: Dict[str, Any],
+                                    override_model: Optional[str] = None) -> Tuple[bool, Dict[str, Any]]:
         """Validate the quality of the output media against requirements.
         
         Args:
             source_metadata: Technical metadata about the source media
             output_metadata: Technical metadata about the output media
             target_requirements: Target quality requirements
+            override_model: Configured model to use instead of the fast model
             
         Returns:
             Tuple of (passed: bool, validation_results: Dict)
         """
-        # Build prompt for quality validation
-        prompt = self._build_validation_prompt(source_metadata, output_metadata, target_requirements)
-        
-        # Get validation from Gemini
-        response = await self.model.generate_content_async(prompt)
+        # Slim the metadata first so equivalent outputs share cache entries and prompts stay small
+        slim_source = _slim(source_metadata)
+        slim_output = _slim(output_metadata)
+        
+        # Serve repeated validations from the cache
+        model_name = self._select_model(override_model, self.fast_model_name)
+        cache_key = self._cache_key('validation', model_name, slim_source, slim_output, target_requirements)
+        cached = await self._cache_lookup(cache_key)
+        if cached is not None:
+            return (cached.get('passed', False), cached)
+        
+        # Get validation from Gemini, sharing the request with identical calls in flight
+        response_text = await self._request_once(
+            cache_key, model_name, lambda: self._build_validation_prompt(slim_source, slim_output, target_requirements)
+        )
         
         # Parse the validation results
         try:
-            validation_results = self._parse_analysis(response.text)
+            validation_results = self._parse_analysis(response_text)
+            await self._cache_store(cache_key, validation_results)
             passed = validation_results.get('passed', False)
             return (passed, validation_results)
         except Exception as e:
-            print(f"Error parsing Gemini output quality validation: {e}")
+            logger.warning("Error parsing Gemini %s: %s", "output quality validation", e)
             return (False, {"passed": False, "error": str(e), "issues": ["Failed to parse validation results"]})
     
+    async def batch_analyze(self, items: List[Tuple[Any, ...]]) -> List[Any]:
+        """Run several analyses concurrently.
+        
+        Args:
+            items: Tuples of a kind ('compatibility', 'parameters' or 'validation')
+                followed by the arguments of the corresponding method
+            
+        Returns:
+            Results in input order; failed requests are replaced by fallbacks
+        """
+        methods = {
+            'compatibility': self.analyze_format_compatibility,
+            'parameters': self.recommend_conversion_parameters,
+            'validation': self.validate_output_quality,
+        }
+        results = await asyncio.gather(
+            *(methods[kind](*args) for kind, *args in items),
+            return_exceptions=True
+        )
+        
+        for index, ((kind, *args), result) in enumerate(zip(items, results)):
+            if not isinstance(result, Exception):
+                continue
+            logger.warning("Error in batched Gemini %s request: %s", kind, result)
+            if kind == 'compatibility':
+                results[index] = self._get_fallback_compatibility_analysis(args[0], args[1])
+            elif kind == 'parameters':
+                results[index] = self._get_fallback_conversion_parameters(args[0], args[1])
+            else:
+                results[index] = (False, {"passed": False, "error": str(result), "issues": ["Validation request failed"]})
+        
+        return results
+    
+    def _select_model(self, override_model: Optional[str], default: str) -> str:
+        """Return the model name to use for a call, validating any override."""
+        if override_model is None:
+            return default
+        if override_model not in self._models:
+            raise ValueError(f"Model {override_model} is not configured on this analyzer")
+        return override_model
+    
+    async def _request_once(self, cache_key: str, model_name: str, build_prompt) -> str:
+        """Send a prompt unless an identical request is already in flight, and return the response text.
+        
+        Args:
+            cache_key: Cache key identifying the request
+            model_name: Name of the model to query
+            build_prompt: Callable building the prompt, only called by the first caller
+            
+        Returns:
+            Text of the Gemini response
+        """
+        # No await between the lookup and the registration, so the check cannot race
+        task = self._inflight.get(cache_key)
+        if task is None:
+            # The request runs in its own task so cancelling any one caller, the first
+            # included, leaves it running for the others
+            task = asyncio.ensure_future(self._generate(build_prompt(), model_name))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda done: self._finish_request(cache_key, done))
+        return await asyncio.shield(task)
+    
+    def _finish_request(self, cache_key: str, task: asyncio.Task) -> None:
+        """Forget a completed in-flight request."""
+        if self._inflight.get(cache_key) is task:
+            del self._inflight[cache_key]
+        # Mark the exception as retrieved in case every caller was cancelled meanwhile
+        if not task.cancelled():
+            task.exception()
+    
+    async def _generate(self, prompt: str, model_name: str,
+                        generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """Stream a prompt's response from Gemini, bounded by the analyzer's concurrency limit.
+        
+        Reading stops as soon as the first JSON object in the response is complete.
+        
+        Args:
+            prompt: Prompt to send
+            model_name: Name of the model to query
+            generation_config: Settings overriding GENERATION_CONFIG for this request only
+            
+        Returns:
+            The JSON object's text, or the whole response if none was found
+        """
+        async with self._semaphore:
+            response = await self._models[model_name].generate_content_async(
+                prompt, stream=True, generation_config=generation_config
+            )
+            chunks = response.__aiter__()
+            buffer = ''
+            try:
+                async for chunk in chunks:
+                    buffer += chunk.text
+                    start = buffer.find('{')
+                    if start < 0:
+                        continue
+                    try:
+                        _, end = _JSON_DECODER.raw_decode(buffer, start)
+                    except json.JSONDecodeError:
+                        continue
+                    return buffer[start:end]
+                return buffer
+            finally:
+                # Drop the rest of the stream instead of waiting for trailing tokens
+                await chunks.aclose()
+    
+    def _canonicalize(self, value: Any) -> Any:
+        """Return a copy of an input with ignored fields dropped and case-insensitive values lowercased."""
+        if isinstance(value, dict):
+            return {
+                key: (item.lower() if key in self._CASE_INSENSITIVE_KEYS and isinstance(item, str)
+                      else self._canonicalize(item))
+                for key, item in value.items()
+                if key not in self._IGNORED_KEYS
+            }
+        if isinstance(value, list):
+            return [self._canonicalize(item) for item in value]
+        return value
+    
+    def _cache_key(self, method: str, model_name: str, *inputs: Any) -> str:
+        """Compute a cache key from the method, model and a hash of each canonical input."""
+        digests = [
+            hashlib.sha256(json.dumps(self._canonicalize(value), sort_keys=True, separators=(',', ':'),
+                                      default=str).encode()).hexdigest()
+            for value in inputs
+        ]
+        return ':'.join([method, model_name, *digests])
+    
+    async def _cache_lookup(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Look a result up in memory, then in the disk cache if configured."""
+        cached = self._cache_get(cache_key)
+        if cached is None and self._disk_cache is not None:
+            cached = await self._disk_cache.get(cache_key)
+            if cached is not None:
+                self._cache_put(cache_key, cached)
+        return cached
+    
+    async def _cache_store(self, cache_key: str, result: Dict[str, Any]) -> None:
+        """Store a result in memory and in the disk cache if configured."""
+        self._cache_put(cache_key, result)
+        if self._disk_cache is not None:
+            await self._disk_cache.put(cache_key, result, ANALYSIS_CACHE_TTL)
+    
+    def _cache_get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of a cached, unexpired result, or None."""
+        entry = self._cache.get(cache_key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._cache[cache_key]
+            return None
+        self._cache.move_to_end(cache_key)
+        return copy.deepcopy(entry[1])
+    
+    def _cache_put(self, cache_key: str, result: Dict[str, Any]) -> None:
+        """Store a parsed result, evicting the least recently used entry."""
+        self._cache[cache_key] = (time.time() + ANALYSIS_CACHE_TTL, copy.deepcopy(result))
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > ANALYSIS_CACHE_SIZE:
+            self._cache.popitem(last=False)
+    
     def _build_compatibility_prompt(self, source_format: Dict[str, Any], target_format: Dict[str, Any]) -> str:
         """Build a prompt for format compatibility analysis."""
-        return f"""You are an expert in media format conversion and compatibility. Analyze the compatibility 
-        between the following source and target formats and provide detailed recommendations for conversion.
-        
-        Source Format:
-        ```json
-        {json.dumps(source_format, indent=2)}
-        ```
-        
-        Target Format:
-        ```json
-        {json.dumps(target_format, indent=2)}
-        ```
-        
-        Provide a detailed analysis of:
-        1. Compatibility issues between the formats
-        2. Quality impact of the conversion
-        3. Recommended conversion approach
-        4. Any special considerations for this specific conversion
-        
-        Return your analysis as a valid JSON object with the following structure:
-        ```json
-        {{
-          "compatibility_score": 0-100,
-          "issues": [],
-          "quality_impact": {{}},
-          "recommended_approach": {{}},
-          "special_considerations": []
-        }}
-        ```
-        
-        Provide only the JSON response without any additional text.
-        """
+        return _COMPATIBILITY_PROMPT_TEMPLATE.format(
+            source_format=_dumps(source_format),
+            target_format=_dumps(target_format)
+        )
     
     def _build_parameters_prompt(self, media_metadata: Dict[str, Any], target_format: Dict[str, Any], content_type: str) -> str:
         """Build a prompt for conversion parameter recommendations."""
-        return f"""You are an expert in media encoding and optimization. Recommend optimal conversion parameters 
-        for the following media based on its content type and target format requirements.
-        
-        Media Metadata:
-        ```json
-        {json.dumps(media_metadata, indent=2)}
-        ```
-        
-        Target Format:
-        ```json
-        {json.dumps(target_format, indent=2)}
-        ```
-        
-        Content Type: {content_type}
-        
-        Based on the content type and technical requirements, recommend:
-        1. Optimal codec-specific parameters
-        2. Appropriate bitrate strategy and values
-        3. Quality preservation techniques
-        4. Content-specific optimizations
-        5. FFmpeg command parameters
-        
-        Return your recommendations as a valid JSON object with the following structure:
-        ```json
-        {{
-          "codec_parameters": {{}},
-          "bitrate_strategy": {{}},
-          "quality_preservation": {{}},
-          "content_optimizations": {{}},
-          "ffmpeg_parameters": []
-        }}
-        ```
-        
-        Provide only the JSON response without any additional text.
-        """
+        return _PARAMETERS_PROMPT_TEMPLATE.format(
+            media_metadata=_dumps(media_metadata),
+            target_format=_dumps(target_format),
+            content_type=content_type
+        )
     
     def _build_validation_prompt(self, source_metadata: Dict[str, Any], output_metadata: Dict[str, Any], 
                                target_requirements: Dict[str, Any]) -> str:
         """Build a prompt for output quality validation."""
-        return f"""You are an expert in media quality assessment. Validate the quality of the converted media 
-        against the target requirements.
-        
-        Source Media Metadata:
-        ```json
-        {json.dumps(source_metadata, indent=2)}
-        ```
-        
-        Output Media Metadata:
-        ```json
-        {json.dumps(output_metadata, indent=2)}
-        ```
-        
-        Target Requirements:
-        ```json
-        {json.dumps(target_requirements, indent=2)}
-        ```
-        
-        Perform a detailed quality assessment:
-        1. Determine if the output meets all technical requirements
-        2. Identify any quality issues or losses
-        3. Evaluate the success of the conversion
-        4. Suggest improvements if needed
-        
-        Return your validation as a valid JSON object with the following structure:
-        ```json
-        {{
-          "passed": true/false,
-          "technical_compliance": {{}},
-          "quality_assessment": {{}},
-          "issues": [],
-          "improvements": []
-        }}
-        ```
-        
-        Provide only the JSON response without any additional text.
-        """
+        return _VALIDATION_PROMPT_TEMPLATE.format(
+            source_metadata=_dumps(source_metadata),
+            output_metadata=_dumps(output_metadata),
+            target_requirements=_dumps(target_requirements)
+        )
     
     def _parse_analysis(self, response_text: str) -> Dict[str, Any]:
         """Parse the analysis from Gemini's response."""
+        # JSON mode normally returns the bare object; otherwise prefer a fenced block
+        match = _JSON_FENCE_RE.search(response_text)
+        text = match.group(1) if match else response_text
         try:
-            # Try to find JSON block in the response if it's not a pure JSON response
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}')
-            
-            if start_idx >= 0 and end_idx > start_idx:
-                json_str = response_text[start_idx:end_idx+1]
-                return json.loads(json_str)
-            else:
-                # If no JSON found, try to parse the whole response
-                return json.loads(response_text)
+            return _json_loads(text)
         except json.JSONDecodeError:
-            raise ValueError(f"Could not parse valid JSON from Gemini response: {response_text}")
+            pass
+        
+        # Decode exactly one object from the first brace, ignoring any surrounding prose
+        start_idx = response_text.find('{')
+        if start_idx >= 0:
+            try:
+                analysis, _ = _JSON_DECODER.raw_decode(response_text, start_idx)
+                return analysis
+            except json.JSONDecodeError:
+                pass
+        raise ValueError(f"Could not parse valid JSON from Gemini response: {response_text}")
+    
+    def _local_compatibility_analysis(self, source_format: Dict[str, Any],
+                                      target_format: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return an analysis for passthrough or well-known conversions, or None if Gemini is needed."""
+        def field(details: Dict[str, Any], key: str) -> Any:
+            value = details.get(key)
+            return value.lower() if isinstance(value, str) else value
+        
+        source = tuple(field(source_format, key) for key in _PASSTHROUGH_KEYS)
+        target = tuple(field(target_format, key) for key in _PASSTHROUGH_KEYS)
+        if source[0] and source == target:
+            return {
+                "compatibility_score": 100,
+                "issues": [],
+                "quality_impact": {"visual_quality": "lossless", "audio_quality": "lossless", "estimated_loss": "0%"},
+                "recommended_approach": {"method": "stream_copy", "tools": ["FFmpeg"], "priority": "quality"},
+                "special_considerations": []
+            }
+        
+        # Known pairs only cover container and codec changes at unchanged resolution and frame rate
+        if source[2:] != target[2:]:
+            return None
+        score = _KNOWN_COMPAT.get(source[:2] + target[:2])
+        if score is None:
+            return None
+        
+        issues = []
+        if source[0] != target[0]:
+            issues.append(f"Format type change from {source[0]} to {target[0]}")
+        if source[1] != target[1]:
+            issues.append(f"Codec change from {source[1]} to {target[1]}")
+        return {
+            "compatibility_score": score,
+            "issues": issues,
+            "quality_impact": {
+                "visual_quality": "high" if score > 70 else "medium",
+                "audio_quality": "high",
+                "estimated_loss": f"{100 - score}%"
+            },
+            "recommended_approach": {
+                "method": "stream_copy" if source[1] == target[1] else "direct_conversion",
+                "tools": ["FFmpeg"],
+                "priority": "quality" if target_format.get('preset') == 'high' else "balance"
+            },
+            "special_considerations": []
+        }
     
     def _get_fallback_compatibility_analysis(self, source_format: Dict[str, Any], target_format: Dict[str, Any]) -> Dict[str, Any]:
         """Generate fallback compatibility analysis if Gemini analysis fails."""
@@ -274,67 +821,23 @@ class GeminiFormatAnalyzer:
         format_type = target_format.get('format', '').lower()
         codec = target_format.get('codec', '').lower()
         preset = target_format.get('preset', 'medium').lower()
-        
-        # Default codec parameters
-        codec_parameters = {}
-        bitrate_strategy = {}
-        ffmpeg_parameters = []
-        
-        # Set parameters based on format and codec
-        if format_type in ['mp4', 'mov', 'mkv'] and codec in ['h264', 'libx264']:
-            codec_parameters = {
-                "preset": preset,
-                "profile": "high",
-                "level": "4.1",
-                "pixel_format": "yuv420p"
-            }
-            
-            if preset == 'high':
-                bitrate_strategy = {"type": "CRF", "value": 18}
-            elif preset == 'low':
-                bitrate_strategy = {"type": "CRF", "value": 28}
-            else:  # medium
-                bitrate_strategy = {"type": "CRF", "value": 23}
-                
-            ffmpeg_parameters = ["-movflags", "+faststart"]
-            
-        elif format_type in ['mp4', 'mov', 'mkv'] and codec in ['h265', 'hevc', 'libx265']:
-            codec_parameters = {
-                "preset": preset,
-                "profile": "main",
-                "pixel_format": "yuv420p"
-            }
-            
-            if preset == 'high':
-                bitrate_strategy = {"type": "CRF", "value": 22}
-            elif preset == 'low':
-                bitrate_strategy = {"type": "CRF", "value": 32}
-            else:  # medium
-                bitrate_strategy = {"type": "CRF", "value": 28}
-        
-        elif format_type in ['mp4', 'mov'] and codec in ['prores', 'prores_ks']:
-            codec_parameters = {
-                "profile": "3" if preset == 'high' else "2",  # 3=HQ, 2=Standard
-                "vendor": "apl0"
-            }
-            
-            bitrate_strategy = {"type": "CBR", "value": "45000k" if preset == 'high' else "30000k"}
+        tier = preset if preset in _FALLBACK_PRESETS else 'medium'
+        
+        # Look the video parameters up, copying so callers can modify the result
+        codec_template, bitrate_template, ffmpeg_template = _FALLBACK_TABLE.get(
+            (format_type, codec, tier), _DEFAULT_FALLBACK
+        )
+        codec_parameters = dict(codec_template)
+        if 'preset' in codec_parameters:
+            codec_parameters['preset'] = preset
+        bitrate_strategy = dict(bitrate_template)
+        ffmpeg_parameters = list(ffmpeg_template)
         
         # Basic audio parameters for audio-only or audio track in video
         audio_parameters = {}
         if 'audio' in media_metadata:
             audio_codec = target_format.get('audio_codec', 'aac').lower()
-            
-            if audio_codec == 'aac':
-                audio_parameters = {
-                    "codec": "aac",
-                    "bitrate": "192k" if preset == 'high' else "128k"
-                }
-            elif audio_codec == 'mp3':
-                audio_parameters = {
-                    "codec": "libmp3lame",
-                    "bitrate": "320k" if preset == 'high' else "192k"
-                }
+            audio_parameters = dict(_FALLBACK_AUDIO_TABLE.get((audio_codec, tier), {}))
         
         return {
             "codec_parameters": codec_parameters,
@@ -1,13 +1,230 @@
 import os
+import re
+import copy
+import shlex
 import json
+import time
 import asyncio
-import subprocess
 import logging
 import tempfile
-from typing import Dict, Any, List, Optional, Tuple
-from datetime import datetime
+from types import MappingProxyType
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
 
-from .ai_analyzer import AIAnalysisModule
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# URL schemes FFmpeg can read from without staging the file locally
+REMOTE_SOURCE_PREFIXES = ("http://", "https://")
+
+# Maximum number of FFprobe results kept per normalizer
+PROBE_CACHE_SIZE = 512
+
+# FFmpeg encoders for codec names that differ from the encoder name
+_CODEC_MAP = {
+    "h264": "libx264",
+    "h265": "libx265",
+    "hevc": "libx265",
+    "prores": "prores_ks",
+    "av1": "libaom-av1",
+    "vp9": "libvpx-vp9",
+}
+
+# FFmpeg flags for video and audio parameters; other parameters are ignored
+_VIDEO_FLAG_MAP = {
+    "crf": "-crf",
+    "preset": "-preset",
+    "profile": "-profile:v",
+    "level": "-level",
+    "pix_fmt": "-pix_fmt",
+    "maxrate": "-maxrate",
+    "minrate": "-minrate",
+    "bufsize": "-bufsize",
+    "qscale": "-qscale:v",
+    "bitrate": "-b:v",
+    "movflags": "-movflags",
+}
+_AUDIO_FLAG_MAP = {
+    "bitrate": "-b:a",
+    "sample_rate": "-ar",
+    "channels": "-ac",
+}
+
+# Hardware encoders to try for each codec, in order of preference
+_HW_ENCODERS = {
+    "h264": ("h264_nvenc", "h264_qsv", "h264_videotoolbox"),
+    "h265": ("hevc_nvenc", "hevc_qsv", "hevc_videotoolbox"),
+    "hevc": ("hevc_nvenc", "hevc_qsv", "hevc_videotoolbox"),
+}
+
+# Presets that need the exact quality of the software encoders
+_SOFTWARE_ONLY_PRESETS = frozenset({"broadcast", "archive"})
+
+# Per hardware encoder family: video flags replacing the software ones (None drops the
+# parameter), and extra arguments added after the encoder
+_HW_VIDEO_FLAG_MAPS = {
+    "nvenc": {**_VIDEO_FLAG_MAP, "crf": "-cq", "preset": None},
+    "qsv": {**_VIDEO_FLAG_MAP, "crf": "-global_quality"},
+    "videotoolbox": {**_VIDEO_FLAG_MAP, "crf": None, "preset": None},
+}
+_HW_EXTRA_ARGS = {
+    "nvenc": ("-preset", "p4", "-rc", "vbr"),
+}
+
+# One-frame test encode proving a hardware encoder actually works on this machine
+_HW_TEST_INPUT = ("-f", "lavfi", "-i", "color=size=256x256:duration=0.1", "-frames:v", "1")
+
+# Video flags only passed for some codecs or containers: flag -> (format parameter, allowed values)
+_GATED_VIDEO_FLAGS = {
+    "level": ("codec", frozenset({"h264", "libx264", "h265", "libx265"})),
+    "movflags": ("format", frozenset({"mp4", "mov"})),
+}
+
+# FFmpeg log lines describing the stream mapping, outputs and encoder settings
+_FFMPEG_LINE_RE = re.compile(rb'^(?:Output.*|.*?(?:Stream mapping:|->|encoder|bitrate).*)$', re.M)
+
+# Line breaks in FFmpeg's log; a carriage return can end a line as well as a newline
+_FFMPEG_LINE_BREAK_RE = re.compile(rb'[\r\n]')
+
+# Keys of FFmpeg's final -progress block summarized in the transformations
+_PROGRESS_SUMMARY_KEYS = ("frame", "fps", "bitrate", "total_size", "out_time", "speed")
+
+# Bytes read from FFmpeg's stderr at a time, and log lines kept for error messages
+STDERR_READ_SIZE = 64 * 1024
+STDERR_TAIL_LINES = 20
+
+# Canonical names of codecs known under several names (encoders and FFprobe codec names)
+_CODEC_CANON = {
+    "h264": "h264", "libx264": "h264", "h264_nvenc": "h264", "h264_qsv": "h264",
+    "h264_videotoolbox": "h264", "h264_vaapi": "h264",
+    "h265": "h265", "hevc": "h265", "libx265": "h265", "hevc_nvenc": "h265", "hevc_qsv": "h265",
+    "hevc_videotoolbox": "h265", "hevc_vaapi": "h265",
+    "av1": "av1", "libaom-av1": "av1", "libsvtav1": "av1",
+    "vp8": "vp8", "libvpx": "vp8", "vp9": "vp9", "libvpx-vp9": "vp9",
+    "prores": "prores", "prores_ks": "prores",
+    "xvid": "mpeg4", "libxvid": "mpeg4", "mpeg4": "mpeg4",
+    "dnxhd": "dnxhd", "dnxhr": "dnxhd",
+    "aac": "aac", "aac_lc": "aac",
+    "mp3": "mp3", "libmp3lame": "mp3",
+    "opus": "opus", "libopus": "opus", "vorbis": "vorbis", "libvorbis": "vorbis",
+    "flac": "flac",
+    "jpeg": "mjpeg", "mjpeg": "mjpeg", "png": "png", "tiff": "tiff",
+    "webp": "webp", "libwebp": "webp", "avif": "av1",
+}
+
+# Number of issues after which a failed validation skips its remaining checks
+MAX_VALIDATION_ISSUES = 2
+
+# Quality presets; unknown presets get the standard parameters
+_PRESET_NAMES = ("web", "social", "broadcast", "archive", "mobile", "standard")
+
+# Containers whose broadcast audio is uncompressed PCM
+_PCM_CONTAINERS = frozenset({"mov", "mxf"})
+
+
+def _codecs_match(expected: str, actual: str) -> bool:
+    """Return whether two codec names refer to the same codec.
+    
+    Names missing from _CODEC_CANON can't be compared reliably and are accepted.
+    """
+    # A generic "pcm" matches any sample format FFprobe reports, e.g. pcm_s16le
+    if expected == "pcm":
+        return actual.startswith("pcm_")
+    if expected.startswith("pcm_"):
+        return actual == expected
+    canonical = _CODEC_CANON.get(expected)
+    if canonical is None:
+        return True
+    return canonical == _CODEC_CANON.get(actual, actual)
+
+
+def _codec_class(codec: str) -> str:
+    """Group codec names whose preset parameters are the same."""
+    if codec in ("h264", "libx264"):
+        return "h264"
+    if codec in ("h265", "libx265"):
+        return "h265"
+    if codec in ("prores", "mjpeg"):
+        return codec
+    return "other"
+
+
+def _preset_parameters(preset: str, codec_class: str, pcm_container: bool) -> Dict[str, Dict[str, Any]]:
+    """Build the video and audio parameters of a preset for one codec class and container."""
+    h264 = codec_class == "h264"
+    prores = codec_class == "prores"
+    if preset == "web":
+        return {
+            "video": {"crf": 23 if h264 else 28, "preset": "medium", "movflags": "+faststart"},
+            "audio": {"codec": "aac", "bitrate": "128k"}
+        }
+    if preset == "social":
+        return {
+            "video": {"crf": 20 if h264 else 25, "preset": "medium", "movflags": "+faststart",
+                      "maxrate": "4M", "bufsize": "8M"},
+            "audio": {"codec": "aac", "bitrate": "192k"}
+        }
+    if preset == "broadcast":
+        return {
+            "video": {
+                "profile": "3" if prores else "high",
+                "level": "5.1" if h264 else None,
+                "preset": "slow" if codec_class in ("h264", "h265") else None,
+                "pix_fmt": "yuv422p10le" if prores else "yuv420p"
+            },
+            "audio": {"codec": "pcm_s24le" if pcm_container else "aac", "sample_rate": "48000"}
+        }
+    if preset == "archive":
+        return {
+            "video": {
+                "profile": "4444" if prores else "high",
+                "pix_fmt": "yuv444p10le" if prores else "yuv420p",
+                "qscale": "1" if codec_class == "mjpeg" else None
+            },
+            "audio": {"codec": "pcm_s24le", "sample_rate": "48000"}
+        }
+    if preset == "mobile":
+        return {
+            "video": {"crf": 26 if h264 else 30, "preset": "medium", "movflags": "+faststart",
+                      "maxrate": "2M", "bufsize": "4M"},
+            "audio": {"codec": "aac", "bitrate": "96k"}
+        }
+    return {
+        "video": {"crf": 23 if h264 else 28, "preset": "medium"},
+        "audio": {"codec": "aac", "bitrate": "192k"}
+    }
+
+
+# Preset parameter templates keyed by (preset, codec class, PCM container), built once at import
+_PRESET_TABLE = MappingProxyType({
+    (preset, codec_class, pcm_container): MappingProxyType({
+        section: MappingProxyType(values)
+        for section, values in _preset_parameters(preset, codec_class, pcm_container).items()
+    })
+    for preset in _PRESET_NAMES
+    for codec_class in ("h264", "h265", "prores", "mjpeg", "other")
+    for pcm_container in (False, True)
+})
+
+
+def _format_number(metadata: Dict[str, Any], key: str, cast: Callable[[Any], Any] = float) -> Any:
+    """Read a numeric field of FFprobe's format section, which reports numbers as strings."""
+    return cast(metadata.get("format", {}).get(key, 0))
+
+
+def _index_streams(metadata: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split a media file's streams into video and audio streams in a single pass."""
+    video_streams, audio_streams = [], []
+    for stream in metadata.get("streams", []):
+        codec_type = stream.get("codec_type")
+        if codec_type == "video":
+            video_streams.append(stream)
+        elif codec_type == "audio":
+            audio_streams.append(stream)
+    return video_streams, audio_streams
 
 class FormatNormalizer:
     """Core class for media format normalization and conversion."""
@@ -19,12 +236,35 @@ class FormatNormalizer:
             ai_api_key: API key for Gemini AI integration. If None, tries to get from environment variable.
             temp_dir: Directory for temporary files. If None, uses system default temp directory.
         """
-        self.ai_analyzer = AIAnalysisModule(api_key=ai_api_key)
+        # The AI module (and the Gemini SDK) is only loaded once an AI-enabled call needs it
+        self._ai_api_key = ai_api_key
+        self._ai_analyzer = None
         self.temp_dir = temp_dir or tempfile.gettempdir()
         self.logger = logging.getLogger(__name__)
+        
+        # LRU cache of FFprobe results: (real path, mtime, size) -> metadata
+        self._probe_cache: "OrderedDict[Tuple[str, int, int], Dict[str, Any]]" = OrderedDict()
+        
+        # FFprobe runs in flight, keyed like the cache, so concurrent calls on a file share one
+        self._probe_inflight: Dict[Tuple[str, int, int], asyncio.Task] = {}
+        
+        # Output directories already created by this normalizer
+        self._created_dirs: set = set()
+        
+        # Detection of usable hardware encoders, run once on first use
+        self._hw_encoders_task: Optional[asyncio.Future] = None
+    
+    @property
+    def ai_analyzer(self):
+        """AI analysis module, created on first access."""
+        if self._ai_analyzer is None:
+            from .ai_analyzer import AIAnalysisModule
+            self._ai_analyzer = AIAnalysisModule(api_key=self._ai_api_key)
+        return self._ai_analyzer
     
     async def normalize(self, source_path: str, output_path: str, target_format: Dict[str, Any],
-                      preset: str = "standard", enable_ai: bool = False, validate_output: bool = True) -> Dict[str, Any]:
+                      preset: str = "standard", enable_ai: bool = False, validate_output: bool = True,
+                      progress_callback: Optional[Callable[[float], None]] = None) -> Dict[str, Any]:
         """Normalize a media file to the target format.
         
         Args:
@@ -34,12 +274,13 @@ class FormatNormalizer:
             preset: Quality preset (web, social, broadcast, archive, mobile)
             enable_ai: Whether to use AI for content-aware optimizations
             validate_output: Whether to validate the output after conversion
+            progress_callback: Called with the conversion progress as a percentage
             
         Returns:
             Dictionary containing normalization results and metadata
         """
         # Start tracking processing time
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         
         # 1. Analyze source media
         source_metadata = await self._analyze_media(source_path)
@@ -63,14 +304,15 @@ class FormatNormalizer:
             source_path=source_path,
             output_path=output_path,
             format_params=format_params,
-            source_metadata=source_metadata
+            source_metadata=source_metadata,
+            progress_callback=progress_callback
         )
         
-        # 5. Analyze the output media
-        if os.path.exists(output_path):
+        # 5. Analyze the output media; _convert_media has already raised if FFmpeg failed
+        try:
             output_metadata = await self._analyze_media(output_path)
-        else:
-            raise RuntimeError(f"Conversion failed: Output file not found at {output_path}")
+        except FileNotFoundError as e:
+            raise RuntimeError(f"Conversion reported success but output missing: {output_path}") from e
         
         # 6. Validate the output if requested
         validation_results = None
@@ -82,8 +324,7 @@ class FormatNormalizer:
             )
         
         # Calculate processing time
-        end_time = datetime.now()
-        processing_time = (end_time - start_time).total_seconds()
+        processing_time = time.perf_counter() - start_time
         
         # Prepare the result object
         result = {
@@ -92,7 +333,7 @@ class FormatNormalizer:
                 "format": output_metadata.get("format", {}).get("format_name", ""),
                 "codec": self._get_codec_info(output_metadata),
                 "duration": output_metadata.get("format", {}).get("duration", 0),
-                "fileSize": os.path.getsize(output_path),
+                "fileSize": _format_number(output_metadata, "size", int) or os.path.getsize(output_path),
                 "resolution": self._get_resolution(output_metadata)
             },
             "metadata": {
@@ -103,7 +344,7 @@ class FormatNormalizer:
             "performance": {
                 "processingTime": processing_time,
                 "qualityMetrics": self._calculate_quality_metrics(source_metadata, output_metadata),
-                "compressionRatio": self._calculate_compression_ratio(source_path, output_path)
+                "compressionRatio": self._calculate_compression_ratio(source_metadata, output_metadata)
             }
         }
         
@@ -117,6 +358,31 @@ class FormatNormalizer:
         
         return result
     
+    async def normalize_many(self, jobs: List[Dict[str, Any]],
+                             concurrency: Optional[int] = None) -> List[Union[Dict[str, Any], Exception]]:
+        """Normalize several media files concurrently.
+        
+        Probes and AI requests of different files overlap, while the number of
+        files being processed at once is capped so FFmpeg does not oversubscribe the CPU.
+        All jobs share this normalizer's probe cache.
+        
+        Args:
+            jobs: Keyword arguments for normalize(), one dict per file
+            concurrency: Maximum number of files processed at once. If None, uses half the
+                CPU count, since each FFmpeg process is itself multithreaded.
+            
+        Returns:
+            Normalization results in job order; a failed job's exception takes its place
+            without cancelling the other jobs
+        """
+        semaphore = asyncio.Semaphore(concurrency or max(1, (os.cpu_count() or 1) // 2))
+        
+        async def run(job: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.normalize(**job)
+        
+        return await asyncio.gather(*(run(job) for job in jobs), return_exceptions=True)
+    
     async def _analyze_media(self, media_path: str) -> Dict[str, Any]:
         """Analyze media file to get technical metadata using FFprobe.
         
@@ -126,9 +392,54 @@ class FormatNormalizer:
         Returns:
             Dictionary containing detailed media metadata
         """
-        if not os.path.exists(media_path):
+        # Remote sources (e.g. signed GCS URLs) are read by FFprobe directly and not cached
+        if media_path.startswith(REMOTE_SOURCE_PREFIXES):
+            return await self._run_ffprobe(media_path)
+        
+        try:
+            st = os.stat(media_path)
+        except FileNotFoundError:
             raise FileNotFoundError(f"Media file not found: {media_path}")
         
+        # A file's metadata only changes with its content, so (path, mtime, size) is a safe key
+        key = (os.path.realpath(media_path), st.st_mtime_ns, st.st_size)
+        metadata = self._probe_cache.get(key)
+        if metadata is not None:
+            self._probe_cache.move_to_end(key)
+            return copy.deepcopy(metadata)
+        
+        # No await between the lookup and the registration, so the check cannot race
+        task = self._probe_inflight.get(key)
+        if task is None:
+            # The probe runs in its own task so cancelling any one caller, the first
+            # included, leaves it running for the others
+            task = asyncio.ensure_future(self._run_ffprobe(media_path))
+            self._probe_inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_probe(key, done))
+        return copy.deepcopy(await asyncio.shield(task))
+    
+    def _finish_probe(self, key: Tuple[str, int, int], task: asyncio.Task) -> None:
+        """Cache a completed probe and forget it as in flight."""
+        if self._probe_inflight.get(key) is task:
+            del self._probe_inflight[key]
+        if task.cancelled():
+            return
+        # Retrieving the exception also keeps it from being reported as unhandled
+        if task.exception() is not None:
+            return
+        self._probe_cache[key] = task.result()
+        if len(self._probe_cache) > PROBE_CACHE_SIZE:
+            self._probe_cache.popitem(last=False)
+    
+    async def _run_ffprobe(self, media_path: str) -> Dict[str, Any]:
+        """Run FFprobe on a media file or URL and parse its output.
+        
+        Args:
+            media_path: Path or URL of the media to analyze
+            
+        Returns:
+            Dictionary containing detailed media metadata
+        """
         # Prepare FFprobe command
         ffprobe_cmd = [
             "ffprobe",
@@ -139,21 +450,20 @@ class FormatNormalizer:
             media_path
         ]
         
-        # Run FFprobe as a subprocess
+        # Run FFprobe as a subprocess driven by the event loop, without holding a worker thread
         try:
-            # Run in an executor to avoid blocking the event loop
-            loop = asyncio.get_event_loop()
-            process = await loop.run_in_executor(
-                None,
-                lambda: subprocess.run(ffprobe_cmd, capture_output=True, text=True)
+            process = await asyncio.create_subprocess_exec(
+                *ffprobe_cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
             )
+            stdout, stderr = await process.communicate()
             
             if process.returncode != 0:
-                self.logger.error(f"FFprobe error: {process.stderr}")
-                raise RuntimeError(f"FFprobe failed with return code {process.returncode}: {process.stderr}")
+                stderr = stderr.decode(errors="replace")
+                self.logger.error(f"FFprobe error: {stderr}")
+                raise RuntimeError(f"FFprobe failed with return code {process.returncode}: {stderr}")
             
-            # Parse the JSON output
-            metadata = json.loads(process.stdout)
+            # Parse the JSON output straight from the raw bytes
+            metadata = _json_loads(stdout)
             return metadata
         
         except json.JSONDecodeError as e:
@@ -188,84 +498,16 @@ class FormatNormalizer:
             "preset": preset,
             "parameters": {}
         }
+        if "hw_accel" in target_format:
+            params["hw_accel"] = bool(target_format["hw_accel"])
         
-        # Apply preset-specific parameters
-        if preset == "web":
-            params["parameters"] = {
-                "video": {
-                    "crf": 23 if codec in ["h264", "libx264"] else 28,
-                    "preset": "medium",
-                    "movflags": "+faststart"
-                },
-                "audio": {
-                    "codec": "aac",
-                    "bitrate": "128k"
-                }
-            }
-        elif preset == "social":
-            params["parameters"] = {
-                "video": {
-                    "crf": 20 if codec in ["h264", "libx264"] else 25,
-                    "preset": "medium",
-                    "movflags": "+faststart",
-                    "maxrate": "4M",
-                    "bufsize": "8M"
-                },
-                "audio": {
-                    "codec": "aac",
-                    "bitrate": "192k"
-                }
-            }
-        elif preset == "broadcast":
-            params["parameters"] = {
-                "video": {
-                    "profile": "3" if codec == "prores" else "high",
-                    "level": "5.1" if codec in ["h264", "libx264"] else None,
-                    "preset": "slow" if codec in ["h264", "libx264", "h265", "libx265"] else None,
-                    "pix_fmt": "yuv422p10le" if codec == "prores" else "yuv420p"
-                },
-                "audio": {
-                    "codec": "pcm_s24le" if format_type in ["mov", "mxf"] else "aac",
-                    "sample_rate": "48000"
-                }
-            }
-        elif preset == "archive":
-            params["parameters"] = {
-                "video": {
-                    "profile": "4444" if codec == "prores" else "high",
-                    "pix_fmt": "yuv444p10le" if codec == "prores" else "yuv420p",
-                    "qscale": "1" if codec == "mjpeg" else None
-                },
-                "audio": {
-                    "codec": "pcm_s24le",
-                    "sample_rate": "48000"
-                }
-            }
-        elif preset == "mobile":
-            params["parameters"] = {
-                "video": {
-                    "crf": 26 if codec in ["h264", "libx264"] else 30,
-                    "preset": "medium",
-                    "movflags": "+faststart",
-                    "maxrate": "2M",
-                    "bufsize": "4M"
-                },
-                "audio": {
-                    "codec": "aac",
-                    "bitrate": "96k"
-                }
-            }
-        else:  # standard preset
-            params["parameters"] = {
-                "video": {
-                    "crf": 23 if codec in ["h264", "libx264"] else 28,
-                    "preset": "medium"
-                },
-                "audio": {
-                    "codec": "aac",
-                    "bitrate": "192k"
-                }
-            }
+        # Copy the preset's template so the parameters can be updated below
+        template = _PRESET_TABLE[(
+            preset if preset in _PRESET_NAMES else "standard",
+            _codec_class(codec),
+            format_type in _PCM_CONTAINERS
+        )]
+        params["parameters"] = {section: dict(values) for section, values in template.items()}
         
         # Add any additional parameters from target_format
         if "parameters" in target_format and isinstance(target_format["parameters"], dict):
@@ -326,7 +568,8 @@ class FormatNormalizer:
         return format_params
     
     async def _convert_media(self, source_path: str, output_path: str, format_params: Dict[str, Any], 
-                          source_metadata: Dict[str, Any]) -> Dict[str, Any]:
+                          source_metadata: Dict[str, Any],
+                          progress_callback: Optional[Callable[[float], None]] = None) -> Dict[str, Any]:
         """Convert media to the target format using FFmpeg.
         
         Args:
@@ -334,68 +577,51 @@ class FormatNormalizer:
             output_path: Path where the converted file should be saved
             format_params: Conversion parameters dictionary
             source_metadata: Metadata of the source media
+            progress_callback: Called with the conversion progress as a percentage
             
         Returns:
             Dictionary containing conversion results
         """
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        # Ensure output directory exists, once per directory
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        if output_dir not in self._created_dirs:
+            os.makedirs(output_dir, exist_ok=True)
+            self._created_dirs.add(output_dir)
         
         # Build FFmpeg command
-        ffmpeg_cmd = ["ffmpeg", "-y", "-i", source_path]
+        # Machine-readable progress goes to stdout; stderr only carries the log
+        ffmpeg_cmd = ["ffmpeg", "-y", "-nostats", "-progress", "pipe:1", "-i", source_path]
         
         # Add video codec parameters if source has video
-        has_video = any(stream.get("codec_type") == "video" for stream in source_metadata.get("streams", []))
-        if has_video and "video" in format_params["parameters"]:
+        source_video_streams, source_audio_streams = _index_streams(source_metadata)
+        if source_video_streams and "video" in format_params["parameters"]:
             video_params = format_params["parameters"]["video"]
             codec = format_params["codec"]
             
-            # Add video codec
-            if codec == "h264":
-                ffmpeg_cmd.extend(["-c:v", "libx264"])
-            elif codec == "h265" or codec == "hevc":
-                ffmpeg_cmd.extend(["-c:v", "libx265"])
-            elif codec == "prores":
-                ffmpeg_cmd.extend(["-c:v", "prores_ks"])
-            elif codec == "av1":
-                ffmpeg_cmd.extend(["-c:v", "libaom-av1"])
-            elif codec == "vp9":
-                ffmpeg_cmd.extend(["-c:v", "libvpx-vp9"])
+            # Add video codec, preferring a working hardware encoder unless exact quality is needed
+            encoder = None
+            if format_params.get("hw_accel", True) and format_params["preset"] not in _SOFTWARE_ONLY_PRESETS:
+                encoder = (await self._get_hw_encoders()).get(codec)
+            if encoder:
+                family = encoder.rsplit("_", 1)[1]
+                ffmpeg_cmd.extend(["-c:v", encoder, *_HW_EXTRA_ARGS.get(family, ())])
+                flag_map = _HW_VIDEO_FLAG_MAPS[family]
             else:
-                ffmpeg_cmd.extend(["-c:v", codec])
+                ffmpeg_cmd.extend(["-c:v", _CODEC_MAP.get(codec, codec)])
+                flag_map = _VIDEO_FLAG_MAP
             
             # Add other video parameters
             for key, value in video_params.items():
-                if value is not None:
-                    if key == "crf":
-                        ffmpeg_cmd.extend(["-crf", str(value)])
-                    elif key == "preset":
-                        ffmpeg_cmd.extend(["-preset", str(value)])
-                    elif key == "profile":
-                        if codec == "prores":
-                            ffmpeg_cmd.extend(["-profile:v", str(value)])
-                        else:
-                            ffmpeg_cmd.extend(["-profile:v", str(value)])
-                    elif key == "level" and codec in ["h264", "libx264", "h265", "libx265"]:
-                        ffmpeg_cmd.extend(["-level", str(value)])
-                    elif key == "pix_fmt":
-                        ffmpeg_cmd.extend(["-pix_fmt", str(value)])
-                    elif key == "maxrate":
-                        ffmpeg_cmd.extend(["-maxrate", str(value)])
-                    elif key == "minrate":
-                        ffmpeg_cmd.extend(["-minrate", str(value)])
-                    elif key == "bufsize":
-                        ffmpeg_cmd.extend(["-bufsize", str(value)])
-                    elif key == "qscale":
-                        ffmpeg_cmd.extend(["-qscale:v", str(value)])
-                    elif key == "bitrate":
-                        ffmpeg_cmd.extend(["-b:v", str(value)])
-                    elif key == "movflags" and format_params["format"] in ["mp4", "mov"]:
-                        ffmpeg_cmd.extend(["-movflags", str(value)])
+                flag = flag_map.get(key)
+                if value is None or flag is None:
+                    continue
+                gate = _GATED_VIDEO_FLAGS.get(key)
+                if gate and format_params[gate[0]] not in gate[1]:
+                    continue
+                ffmpeg_cmd.extend([flag, str(value)])
         
         # Add audio codec parameters if source has audio
-        has_audio = any(stream.get("codec_type") == "audio" for stream in source_metadata.get("streams", []))
-        if has_audio and "audio" in format_params["parameters"]:
+        if source_audio_streams and "audio" in format_params["parameters"]:
             audio_params = format_params["parameters"]["audio"]
             
             # Add audio codec
@@ -404,13 +630,9 @@ class FormatNormalizer:
             
             # Add other audio parameters
             for key, value in audio_params.items():
-                if value is not None and key != "codec":
-                    if key == "bitrate":
-                        ffmpeg_cmd.extend(["-b:a", str(value)])
-                    elif key == "sample_rate":
-                        ffmpeg_cmd.extend(["-ar", str(value)])
-                    elif key == "channels":
-                        ffmpeg_cmd.extend(["-ac", str(value)])
+                flag = _AUDIO_FLAG_MAP.get(key)
+                if value is not None and flag is not None:
+                    ffmpeg_cmd.extend([flag, str(value)])
         
         # Add any additional custom FFmpeg options
         if "ffmpeg_options" in format_params["parameters"]:
@@ -424,28 +646,46 @@ class FormatNormalizer:
         # Add output path
         ffmpeg_cmd.append(output_path)
         
-        # Log the FFmpeg command
-        self.logger.info(f"FFmpeg command: {' '.join(ffmpeg_cmd)}")
+        # Log the FFmpeg command, only quoting it when INFO logging is enabled
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("FFmpeg command: %s", shlex.join(ffmpeg_cmd))
         
-        # Run FFmpeg as a subprocess
+        # Run FFmpeg as a subprocess driven by the event loop, without holding a worker thread
         try:
-            # Run in an executor to avoid blocking the event loop
-            loop = asyncio.get_event_loop()
-            process = await loop.run_in_executor(
-                None,
-                lambda: subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
+            process = await asyncio.create_subprocess_exec(
+                *ffmpeg_cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
             )
+            duration = _format_number(source_metadata, "duration")
+            try:
+                # Both pipes are drained together so neither can fill up and stall FFmpeg
+                progress, (transformations, log_tail) = await asyncio.gather(
+                    self._read_ffmpeg_progress(process.stdout, duration, progress_callback),
+                    self._read_ffmpeg_stderr(process.stderr)
+                )
+                returncode = await process.wait()
+            except BaseException:
+                # Cancelled or a reader/callback raised: don't leave FFmpeg writing a partial output
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                raise
             
-            if process.returncode != 0:
-                self.logger.error(f"FFmpeg error: {process.stderr}")
-                raise RuntimeError(f"FFmpeg failed with return code {process.returncode}: {process.stderr}")
+            if returncode != 0:
+                stderr = "\n".join(log_tail)
+                self.logger.error(f"FFmpeg error: {stderr}")
+                raise RuntimeError(f"FFmpeg failed with return code {process.returncode}: {stderr}")
             
-            # Parse the transformations from the FFmpeg output
-            transformations = self._parse_ffmpeg_output(process.stderr)
+            if progress_callback:
+                progress_callback(100.0)
+            
+            # Summarize the final encoding statistics, like FFmpeg's last status line
+            summary = " ".join(f"{key}={progress[key]}" for key in _PROGRESS_SUMMARY_KEYS if key in progress)
+            if summary:
+                transformations.append(summary)
             
             return {
                 "success": True,
-                "command": ' '.join(ffmpeg_cmd),
+                "command": ffmpeg_cmd,
                 "transformations": transformations
             }
         
@@ -453,6 +693,54 @@ class FormatNormalizer:
             self.logger.error(f"Error converting media with FFmpeg: {e}")
             raise RuntimeError(f"Media conversion failed: {e}")
     
+    async def _get_hw_encoders(self) -> Dict[str, str]:
+        """Return the working hardware encoder for each codec, detecting them on first use."""
+        if self._hw_encoders_task is None:
+            self._hw_encoders_task = asyncio.ensure_future(self._detect_hw_encoders())
+        return await self._hw_encoders_task
+    
+    async def _detect_hw_encoders(self) -> Dict[str, str]:
+        """Find hardware encoders that FFmpeg was built with and that can encode here.
+        
+        Returns:
+            Dictionary mapping codec names to hardware encoder names
+        """
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-hide_banner", "-encoders",
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+            )
+            stdout, _ = await process.communicate()
+        except OSError as e:
+            self.logger.warning(f"Could not list FFmpeg encoders: {e}")
+            return {}
+        
+        # Encoder lines look like " V....D h264_nvenc   NVIDIA NVENC H.264 encoder"
+        available = {parts[1] for parts in map(bytes.split, stdout.splitlines()) if len(parts) > 1}
+        available = {name.decode("ascii", "replace") for name in available}
+        
+        # Being built in does not mean the device is present, so try each candidate once
+        working = {}
+        hw_encoders = {}
+        for codec, candidates in _HW_ENCODERS.items():
+            for encoder in candidates:
+                if encoder not in available:
+                    continue
+                if encoder not in working:
+                    process = await asyncio.create_subprocess_exec(
+                        "ffmpeg", "-hide_banner", "-loglevel", "error", *_HW_TEST_INPUT,
+                        "-c:v", encoder, "-f", "null", "-",
+                        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+                    )
+                    working[encoder] = await process.wait() == 0
+                if working[encoder]:
+                    hw_encoders[codec] = encoder
+                    break
+        
+        if hw_encoders:
+            self.logger.info(f"Using hardware encoders: {hw_encoders}")
+        return hw_encoders
+    
     async def _validate_output(self, source_metadata: Dict[str, Any], output_metadata: Dict[str, Any], 
                             target_format: Dict[str, Any]) -> Dict[str, Any]:
         """Validate the output media against requirements.
@@ -473,6 +761,9 @@ class FormatNormalizer:
         
         # Validate basic format requirements
         try:
+            source_video_streams = _index_streams(source_metadata)[0]
+            output_video_streams, output_audio_streams = _index_streams(output_metadata)
+            
             # Check format type
             output_format = output_metadata.get("format", {}).get("format_name", "").lower()
             expected_format = target_format.get("format", "").lower()
@@ -482,63 +773,56 @@ class FormatNormalizer:
                 validation["issues"].append(f"Expected format {expected_format}, got {output_format}")
             
             # Check video codec if applicable
-            has_video = any(stream.get("codec_type") == "video" for stream in output_metadata.get("streams", []))
-            if has_video:
-                video_stream = next((s for s in output_metadata.get("streams", []) if s.get("codec_type") == "video"), None)
-                if video_stream:
-                    output_codec = video_stream.get("codec_name", "").lower()
-                    expected_codec = target_format.get("codec", "").lower()
-                    
-                    # Handle codec name variations
-                    if expected_codec == "h264" and output_codec not in ["h264", "libx264"]:
-                        validation["passed"] = False
-                        validation["issues"].append(f"Expected video codec h264, got {output_codec}")
-                    elif expected_codec == "h265" and output_codec not in ["h265", "hevc", "libx265"]:
-                        validation["passed"] = False
-                        validation["issues"].append(f"Expected video codec h265/hevc, got {output_codec}")
+            if output_video_streams:
+                output_codec = output_video_streams[0].get("codec_name", "").lower()
+                expected_codec = target_format.get("codec", "").lower()
+                
+                if expected_codec and not _codecs_match(expected_codec, output_codec):
+                    validation["passed"] = False
+                    validation["issues"].append(f"Expected video codec {expected_codec}, got {output_codec}")
             
             # Check audio codec if applicable
-            has_audio = any(stream.get("codec_type") == "audio" for stream in output_metadata.get("streams", []))
-            if has_audio and "audio" in target_format["parameters"]:
-                audio_stream = next((s for s in output_metadata.get("streams", []) if s.get("codec_type") == "audio"), None)
-                if audio_stream:
-                    output_codec = audio_stream.get("codec_name", "").lower()
-                    expected_codec = target_format["parameters"]["audio"].get("codec", "").lower()
-                    
-                    if expected_codec and output_codec != expected_codec:
-                        # Handle codec name variations
-                        if not (expected_codec == "aac" and output_codec in ["aac", "aac_lc"]):
-                            validation["passed"] = False
-                            validation["issues"].append(f"Expected audio codec {expected_codec}, got {output_codec}")
+            if output_audio_streams and "audio" in target_format["parameters"]:
+                output_codec = output_audio_streams[0].get("codec_name", "").lower()
+                expected_codec = target_format["parameters"]["audio"].get("codec", "").lower()
+                
+                if expected_codec and not _codecs_match(expected_codec, output_codec):
+                    validation["passed"] = False
+                    validation["issues"].append(f"Expected audio codec {expected_codec}, got {output_codec}")
+            
+            # The output is already rejected; the remaining checks would only add detail
+            if not validation["passed"] and len(validation["issues"]) >= MAX_VALIDATION_ISSUES:
+                return validation
+            
+            # Convert the compared numbers once
+            source_size = _format_number(source_metadata, "size", int)
+            output_size = _format_number(output_metadata, "size", int)
+            source_duration = _format_number(source_metadata, "duration")
+            output_duration = _format_number(output_metadata, "duration")
             
             # Check for significant quality loss
-            if has_video:
-                source_video = next((s for s in source_metadata.get("streams", []) if s.get("codec_type") == "video"), None)
-                output_video = next((s for s in output_metadata.get("streams", []) if s.get("codec_type") == "video"), None)
+            if source_video_streams and output_video_streams:
+                # Check resolution change
+                source_video = source_video_streams[0]
+                output_video = output_video_streams[0]
+                source_width = int(source_video.get("width", 0))
+                source_height = int(source_video.get("height", 0))
+                output_width = int(output_video.get("width", 0))
+                output_height = int(output_video.get("height", 0))
                 
-                if source_video and output_video:
-                    # Check resolution change
-                    source_width = int(source_video.get("width", 0))
-                    source_height = int(source_video.get("height", 0))
-                    output_width = int(output_video.get("width", 0))
-                    output_height = int(output_video.get("height", 0))
+                # Calculate resolution reduction percentage
+                if source_width > 0 and source_height > 0:
+                    source_pixels = source_width * source_height
+                    output_pixels = output_width * output_height
+                    resolution_reduction = 100 - (output_pixels / source_pixels * 100)
                     
-                    # Calculate resolution reduction percentage
-                    if source_width > 0 and source_height > 0:
-                        source_pixels = source_width * source_height
-                        output_pixels = output_width * output_height
-                        resolution_reduction = 100 - (output_pixels / source_pixels * 100)
-                        
-                        if resolution_reduction > 10:  # More than 10% reduction in pixels
-                            validation["issues"].append(
-                                f"Resolution reduced by {resolution_reduction:.1f}% "
-                                f"({source_width}x{source_height} -> {output_width}x{output_height})"
-                            )
+                    if resolution_reduction > 10:  # More than 10% reduction in pixels
+                        validation["issues"].append(
+                            f"Resolution reduced by {resolution_reduction:.1f}% "
+                            f"({source_width}x{source_height} -> {output_width}x{output_height})"
+                        )
             
             # Check if output file exists and has reasonable size
-            source_size = int(source_metadata.get("format", {}).get("size", 0))
-            output_size = int(output_metadata.get("format", {}).get("size", 0))
-            
             if output_size <= 0:
                 validation["passed"] = False
                 validation["issues"].append("Output file has zero size")
@@ -546,11 +830,9 @@ class FormatNormalizer:
                 validation["issues"].append(f"Output file is suspiciously small ({output_size} bytes, {output_size/source_size:.1%} of source)")
             
             # Check duration change
-            source_duration = float(source_metadata.get("format", {}).get("duration", 0))
-            output_duration = float(output_metadata.get("format", {}).get("duration", 0))
-            
-            if source_duration > 0 and abs(output_duration - source_duration) > 1.0:  # More than 1 second difference
-                duration_change_pct = abs(output_duration - source_duration) / source_duration * 100
+            duration_change = abs(output_duration - source_duration)
+            if source_duration > 0 and duration_change > 1.0:  # More than 1 second difference
+                duration_change_pct = duration_change / source_duration * 100
                 if duration_change_pct > 1:  # More than 1% change
                     validation["issues"].append(
                         f"Duration changed by {duration_change_pct:.1f}% "
@@ -564,28 +846,56 @@ class FormatNormalizer:
         
         return validation
     
-    def _parse_ffmpeg_output(self, stderr_output: str) -> List[str]:
-        """Parse FFmpeg output to extract transformation information.
+    async def _read_ffmpeg_progress(self, stdout: asyncio.StreamReader, duration: float,
+                                    progress_callback: Optional[Callable[[float], None]]) -> Dict[str, str]:
+        """Read FFmpeg's -progress output, reporting progress as it goes.
         
         Args:
-            stderr_output: FFmpeg stderr output string
+            stdout: FFmpeg's stdout pipe carrying key=value progress lines
+            duration: Source duration in seconds, or 0 if unknown
+            progress_callback: Called with the conversion progress as a percentage
             
         Returns:
-            List of transformation descriptions
+            The values of the last progress block
         """
-        transformations = []
-        
-        # Extract stream mapping information
-        mapping_lines = [line for line in stderr_output.split('\n') if "Stream mapping:" in line or "->" in line]
-        if mapping_lines:
-            transformations.extend(mapping_lines)
-        
-        # Extract encoding parameters
-        for line in stderr_output.split('\n'):
-            if line.startswith("Output") or "encoder" in line or "bitrate" in line:
-                transformations.append(line.strip())
+        progress = {}
+        duration_us = duration * 1_000_000 if progress_callback else 0
+        async for raw in stdout:
+            key, sep, value = raw.decode("utf-8", "replace").strip().partition("=")
+            if not sep:
+                continue
+            # Some values are padded, e.g. "bitrate=  81.9kbits/s"
+            value = value.strip()
+            progress[key] = value
+            if key == "out_time_us" and duration_us > 0 and value.isdigit():
+                progress_callback(min(100.0, int(value) * 100 / duration_us))
+        return progress
+    
+    async def _read_ffmpeg_stderr(self, stderr: asyncio.StreamReader) -> Tuple[List[str], deque]:
+        """Consume FFmpeg's log as it is written, without buffering all of it.
         
-        return transformations
+        Args:
+            stderr: FFmpeg's stderr pipe
+            
+        Returns:
+            Tuple of (transformation descriptions, last log lines for error messages)
+        """
+        transformations = []
+        log_tail = deque(maxlen=STDERR_TAIL_LINES)
+        pending = b""
+        while True:
+            chunk = await stderr.read(STDERR_READ_SIZE)
+            lines = _FFMPEG_LINE_BREAK_RE.split(pending + chunk)
+            # The last piece is an unfinished line unless the stream has ended
+            pending = lines.pop() if chunk else b""
+            for line in lines:
+                if not line:
+                    continue
+                if _FFMPEG_LINE_RE.match(line):
+                    transformations.append(line.decode("utf-8", "replace").strip())
+                log_tail.append(line.decode("utf-8", "replace"))
+            if not chunk:
+                return transformations, log_tail
     
     def _get_codec_info(self, metadata: Dict[str, Any]) -> str:
         """Extract codec information from media metadata.
@@ -616,12 +926,12 @@ class FormatNormalizer:
         Returns:
             Dictionary with width and height, or empty dict if not video
         """
-        for stream in metadata.get("streams", []):
-            if stream.get("codec_type") == "video":
-                return {
-                    "width": int(stream.get("width", 0)),
-                    "height": int(stream.get("height", 0))
-                }
+        video_streams = _index_streams(metadata)[0]
+        if video_streams:
+            return {
+                "width": int(video_streams[0].get("width", 0)),
+                "height": int(video_streams[0].get("height", 0))
+            }
         
         return {}
     
@@ -637,9 +947,12 @@ class FormatNormalizer:
         """
         metrics = {}
         
+        source_video_streams, source_audio_streams = _index_streams(source_metadata)
+        output_video_streams, output_audio_streams = _index_streams(output_metadata)
+        
         # Compare video streams if present
-        source_video = next((s for s in source_metadata.get("streams", []) if s.get("codec_type") == "video"), None)
-        output_video = next((s for s in output_metadata.get("streams", []) if s.get("codec_type") == "video"), None)
+        source_video = source_video_streams[0] if source_video_streams else None
+        output_video = output_video_streams[0] if output_video_streams else None
         
         if source_video and output_video:
             # Compare resolution
@@ -672,8 +985,8 @@ class FormatNormalizer:
                 metrics["estimated_visual_quality"] = min(100, estimated_quality)
         
         # Compare audio streams if present
-        source_audio = next((s for s in source_metadata.get("streams", []) if s.get("codec_type") == "audio"), None)
-        output_audio = next((s for s in output_metadata.get("streams", []) if s.get("codec_type") == "audio"), None)
+        source_audio = source_audio_streams[0] if source_audio_streams else None
+        output_audio = output_audio_streams[0] if output_audio_streams else None
         
         if source_audio and output_audio:
             # Compare audio bitrate
@@ -687,23 +1000,21 @@ class FormatNormalizer:
         
         return metrics
     
-    def _calculate_compression_ratio(self, source_path: str, output_path: str) -> float:
+    def _calculate_compression_ratio(self, source_metadata: Dict[str, Any], output_metadata: Dict[str, Any]) -> float:
         """Calculate compression ratio between source and output files.
         
         Args:
-            source_path: Path to the source file
-            output_path: Path to the output file
+            source_metadata: Metadata of the source media
+            output_metadata: Metadata of the output media
             
         Returns:
             Compression ratio (source_size / output_size)
         """
-        if not os.path.exists(source_path) or not os.path.exists(output_path):
-            return 0.0
-        
-        source_size = os.path.getsize(source_path)
-        output_size = os.path.getsize(output_path)
+        # FFprobe already reported both sizes, so no need to stat the files again
+        source_size = _format_number(source_metadata, "size", int)
+        output_size = _format_number(output_metadata, "size", int)
         
-        if output_size <= 0:
+        if source_size <= 0 or output_size <= 0:
             return 0.0
         
         return source_size / output_size
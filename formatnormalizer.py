@@ -5,21 +5,214 @@ This module provides the main functionality for media format normalization.
 """
 
 import os
+import copy
 import json
+import time
 import uuid
+import asyncio
+import sqlite3
 import logging
+import itertools
+import threading
 import subprocess
 import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-from typing import Dict, List, Optional, Union, Any
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple, Union, Any
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("formatnormalizer")
 
+# Persistent FFprobe result cache, reused across runs and batch worker processes
+PROBE_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "formatnormalizer",
+    "probe.db"
+)
+
+# Built-in conversion presets by output format and preset name (in a real
+# implementation these would load from a database or config file)
+_PRESETS: Mapping[str, Mapping[str, Mapping[str, Any]]] = MappingProxyType({
+    "mp4": {
+        "web": {
+            "c:v": "libx264",
+            "c:a": "aac",
+            "b:v": "2M",
+            "b:a": "128k",
+            "preset": "medium",
+            "profile:v": "high",
+            "pix_fmt": "yuv420p"
+        },
+        "broadcast": {
+            "c:v": "libx264",
+            "c:a": "aac",
+            "b:v": "8M",
+            "b:a": "384k",
+            "preset": "slow",
+            "profile:v": "high"
+        },
+        "archive": {
+            "c:v": "libx265",
+            "c:a": "aac",
+            "crf": "18",
+            "preset": "slow",
+            "pix_fmt": "yuv420p10le"
+        }
+    },
+    "mov": {
+        "broadcast": {
+            "c:v": "prores_ks",
+            "profile:v": "3",
+            "vendor": "apl0",
+            "c:a": "pcm_s24le"
+        }
+    },
+    "wav": {
+        "standard": {
+            "c:a": "pcm_s24le",
+            "ar": "48000",
+            "ac": "2"
+        }
+    },
+    "mp3": {
+        "web": {
+            "c:a": "libmp3lame",
+            "b:a": "192k",
+            "ar": "44100"
+        }
+    }
+})
+
+# Parameters used when a format/preset combination isn't defined
+_DEFAULT_PRESET = MappingProxyType({"c:v": "copy", "c:a": "copy"})
+
+
+def _params_to_args(params: Mapping[str, Any]) -> List[str]:
+    """
+    Turn conversion parameters into FFmpeg "-key value" arguments.
+    
+    Args:
+        params: Parameter names (without the leading dash) and values
+        
+    Returns:
+        Flat FFmpeg argument list
+    """
+    args = []
+    for param, value in params.items():
+        if param.startswith("_"):  # Skip internal parameters
+            continue
+            
+        if isinstance(value, bool):
+            if value:  # Only add flag if True
+                args.append(f"-{param}")
+        else:
+            args.append(f"-{param}")
+            args.append(str(value))
+    return args
+
+
+# FFmpeg arguments for each built-in preset, rendered once since the table never changes
+_PRESET_ARGS: Mapping[Tuple[str, str], Tuple[str, ...]] = MappingProxyType({
+    (format_type, preset_name): tuple(_params_to_args(params))
+    for format_type, presets in _PRESETS.items()
+    for preset_name, params in presets.items()
+})
+
+# FFmpeg arguments for the stream-copy fallback
+_DEFAULT_PRESET_ARGS = tuple(_params_to_args(_DEFAULT_PRESET))
+
+
+# Codec names FFprobe reports for encoders whose name differs from the codec
+_ENCODER_CODECS = MappingProxyType({
+    "libx264": "h264",
+    "libx265": "hevc",
+    "libmp3lame": "mp3",
+    "prores_ks": "prores",
+})
+
+# Container names FFprobe reports (format_name) for output file extensions
+_PROBE_CONTAINERS = MappingProxyType({
+    "mp4": "mov,mp4,m4a,3gp,3g2,mj2",
+    "mov": "mov,mp4,m4a,3gp,3g2,mj2",
+    "m4a": "mov,mp4,m4a,3gp,3g2,mj2",
+    "mkv": "matroska,webm",
+    "webm": "matroska,webm",
+    "ts": "mpegts",
+})
+
+# Per-process sequence that keeps job IDs created in the same second unique
+_job_counter = itertools.count()
+
+
+def _new_job_id(prefix: str) -> str:
+    """Build a unique job ID; the PID separates IDs made in batch worker processes."""
+    return f"{prefix}_{int(time.time())}_{os.getpid()}_{next(_job_counter)}"
+
+
+def _lookup_preset(format_type: str, preset_name: str) -> Dict[str, Any]:
+    """Return a mutable copy of a preset's parameters, falling back to stream copy."""
+    params = _PRESETS.get(format_type, {}).get(preset_name)
+    if params is None:
+        logger.warning(f"Preset {preset_name} for format {format_type} not found, using defaults")
+        params = _DEFAULT_PRESET
+    return dict(params)
+
+
+def _compute_destination(source: str, output_format: str, destination_folder: str = "") -> str:
+    """
+    Build the output path for a source file.
+    
+    Args:
+        source: Path to source media
+        output_format: Output format used as the file extension
+        destination_folder: Folder for the output; when empty the output is
+            written next to the source with a "_normalized" suffix
+        
+    Returns:
+        Output file path
+    """
+    source_dir, file_name = os.path.split(source)
+    base_name = os.path.splitext(file_name)[0]
+    if destination_folder:
+        return os.path.join(destination_folder, f"{base_name}.{output_format}")
+    # Use same directory as source if no destination specified
+    return os.path.join(source_dir, f"{base_name}_normalized.{output_format}")
+
+
+def _normalize_one(source: str,
+                   destination: str,
+                   output_format: str,
+                   preset: str,
+                   preserve_metadata: bool,
+                   ffmpeg_threads: int) -> 'NormalizationResult':
+    """Normalize a single file; module-level so it can run in a worker process."""
+    return FormatNormalizer(ffmpeg_threads=ffmpeg_threads).normalize(
+        source=source,
+        output_format=output_format,
+        preset=preset,
+        preserve_metadata=preserve_metadata,
+        destination=destination
+    )
+
+
 class MediaFormat:
     """Represents a media format with all its properties."""
     
+    # No per-instance __dict__; one of these is created for every probed file
+    __slots__ = (
+        "container", "video_codec", "audio_codec", "width", "height",
+        "frame_rate", "duration", "bitrate", "file_size"
+    )
+    
     def __init__(self, 
                  container: str = "",
                  video_codec: str = "",
@@ -57,22 +250,32 @@ class MediaFormat:
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'MediaFormat':
         """Create MediaFormat from dictionary."""
+        # Bound lookup and positional arguments, in __init__ order; this runs
+        # for every record when loading stored results and the probe cache
+        get = data.get
         return cls(
-            container=data.get("container", ""),
-            video_codec=data.get("video_codec", ""),
-            audio_codec=data.get("audio_codec", ""),
-            width=data.get("width", 0),
-            height=data.get("height", 0),
-            frame_rate=data.get("frame_rate", 0),
-            duration=data.get("duration", 0),
-            bitrate=data.get("bitrate", 0),
-            file_size=data.get("file_size", 0)
+            get("container", ""),
+            get("video_codec", ""),
+            get("audio_codec", ""),
+            get("width", 0),
+            get("height", 0),
+            get("frame_rate", 0),
+            get("duration", 0),
+            get("bitrate", 0),
+            get("file_size", 0)
         )
 
 
 class NormalizationResult:
     """Represents the result of a media normalization operation."""
     
+    __slots__ = (
+        "job_id", "source", "destination", "process_timestamp",
+        "original_format", "normalized_format", "compression_ratio",
+        "quality_metrics", "metadata_preserved", "processing_time",
+        "preset_used", "custom_params", "output_path", "original_size", "new_size"
+    )
+    
     def __init__(self,
                  job_id: str,
                  source: str,
@@ -121,18 +324,21 @@ class NormalizationResult:
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'NormalizationResult':
         """Create NormalizationResult from dictionary."""
+        # Positional arguments in __init__ order, as in MediaFormat.from_dict
+        get = data.get
+        from_format = MediaFormat.from_dict
         return cls(
-            job_id=data.get("job_id", ""),
-            source=data.get("source", ""),
-            destination=data.get("destination", ""),
-            original_format=MediaFormat.from_dict(data.get("original_format", {})),
-            normalized_format=MediaFormat.from_dict(data.get("normalized_format", {})),
-            compression_ratio=data.get("compression_ratio", 0),
-            quality_metrics=data.get("quality_metrics", {}),
-            metadata_preserved=data.get("metadata_preserved", False),
-            processing_time=data.get("processing_time", 0),
-            preset_used=data.get("preset_used", ""),
-            custom_params=data.get("custom_params", {})
+            get("job_id", ""),
+            get("source", ""),
+            get("destination", ""),
+            from_format(get("original_format") or {}),
+            from_format(get("normalized_format") or {}),
+            get("compression_ratio", 0),
+            get("quality_metrics", {}),
+            get("metadata_preserved", False),
+            get("processing_time", 0),
+            get("preset_used", ""),
+            get("custom_params", {})
         )
 
 
@@ -144,13 +350,16 @@ class BatchJob:
                  output_format: str,
                  preset: str,
                  preserve_metadata: bool = True,
-                 destination_folder: str = ""):
-        self.job_id = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                 destination_folder: str = "",
+                 parallelization: int = None):
+        self.job_id = _new_job_id("batch")
         self.media_sources = media_sources
         self.output_format = output_format
         self.preset = preset
         self.preserve_metadata = preserve_metadata
         self.destination_folder = destination_folder
+        # Number of files encoded concurrently; defaults to half the cores
+        self.parallelization = parallelization or max(1, (os.cpu_count() or 1) // 2)
         self.status = {
             "total_count": len(media_sources),
             "processed_count": 0,
@@ -164,48 +373,43 @@ class BatchJob:
         """Start processing the batch job."""
         logger.info(f"Starting batch job {self.job_id} with {len(self.media_sources)} files")
         
-        # This would typically run in a background thread or separate process
-        # For simplicity, we'll just process synchronously here
-        normalizer = FormatNormalizer()
+        # Resolve every destination before dispatching so the submit loop stays tight
+        pairs = [
+            (source, _compute_destination(source, self.output_format, self.destination_folder))
+            for source in self.media_sources
+        ]
         
-        for source in self.media_sources:
-            try:
-                # Determine destination path
-                if self.destination_folder:
-                    file_name = os.path.basename(source)
-                    base_name = os.path.splitext(file_name)[0]
-                    destination = os.path.join(
-                        self.destination_folder, 
-                        f"{base_name}.{self.output_format}"
-                    )
-                else:
-                    # Use same directory as source if no destination specified
-                    source_dir = os.path.dirname(source)
-                    file_name = os.path.basename(source)
-                    base_name = os.path.splitext(file_name)[0]
-                    destination = os.path.join(
-                        source_dir, 
-                        f"{base_name}_normalized.{self.output_format}"
-                    )
-                
-                # Process the file
-                result = normalizer.normalize(
-                    source=source,
-                    output_format=self.output_format,
-                    preset=self.preset,
-                    preserve_metadata=self.preserve_metadata,
-                    destination=destination
-                )
-                
-                # Store the result
-                self.results[source] = result
-                self.status["success_count"] += 1
-                
-            except Exception as e:
-                logger.error(f"Error processing {source}: {str(e)}")
-                self.status["failed_count"] += 1
+        # Split the cores between the concurrent FFmpeg processes so they don't oversubscribe
+        ffmpeg_threads = max(1, (os.cpu_count() or 1) // self.parallelization)
+        
+        # Each file is an independent FFmpeg run, so fan out across worker processes.
+        # Status is only updated here as futures complete, so no locking is needed.
+        with ProcessPoolExecutor(max_workers=self.parallelization) as executor:
+            futures = {
+                executor.submit(
+                    _normalize_one,
+                    source,
+                    destination,
+                    self.output_format,
+                    self.preset,
+                    self.preserve_metadata,
+                    ffmpeg_threads
+                ): source
+                for source, destination in pairs
+            }
             
-            self.status["processed_count"] += 1
+            for future in as_completed(futures):
+                source = futures[future]
+                try:
+                    # Store the result
+                    self.results[source] = future.result()
+                    self.status["success_count"] += 1
+                    
+                except Exception as e:
+                    logger.error(f"Error processing {source}: {str(e)}")
+                    self.status["failed_count"] += 1
+                
+                self.status["processed_count"] += 1
         
         self.status["is_complete"] = True
         logger.info(f"Batch job {self.job_id} completed: {self.status}")
@@ -221,16 +425,259 @@ class BatchJob:
         return self.results
 
 
+def _split_streams(streams: List[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Pick the first video and first audio stream in a single pass.
+    
+    Args:
+        streams: Stream entries from FFprobe output
+        
+    Returns:
+        Tuple of (video stream, audio stream); either may be None
+    """
+    video_stream = audio_stream = None
+    for stream in streams:
+        codec_type = stream.get("codec_type")
+        if codec_type == "video" and video_stream is None:
+            video_stream = stream
+        elif codec_type == "audio" and audio_stream is None:
+            audio_stream = stream
+        # Subtitle, data and attachment streams usually follow the main ones
+        if video_stream is not None and audio_stream is not None:
+            break
+    return video_stream, audio_stream
+
+
+@lru_cache(maxsize=64)
+def _parse_rate(rate: str) -> float:
+    """
+    Parse an FFprobe frame rate such as "30000/1001" or "25".
+    
+    A library only uses a handful of distinct rates, so results are cached.
+    
+    Args:
+        rate: Frame rate as a fraction or plain number
+        
+    Returns:
+        Frames per second, or 0.0 if the rate is undefined or malformed
+    """
+    numerator, _, denominator = rate.partition('/')
+    try:
+        if not denominator:
+            return float(numerator)
+        denominator = float(denominator)
+        return float(numerator) / denominator if denominator else 0.0
+    except ValueError:
+        return 0.0
+
+
+# Only the FFprobe fields analyze() reads; skipping tags and side data keeps the JSON small
+_FFPROBE_ENTRIES = (
+    "format=format_name,duration,bit_rate"
+    ":stream=codec_type,codec_name,width,height,r_frame_rate"
+)
+
+
+class _FFProbeCache:
+    """Persistent SQLite store of analysis results shared across runs and processes."""
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._disabled = False
+    
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # Connections can't cross a fork, so batch worker processes open their own
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        if self._disabled:
+            return None
+        try:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            # WAL lets parallel workers read while another one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS probe ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, data TEXT)"
+            )
+            conn.commit()
+        except (OSError, sqlite3.Error) as e:
+            # The cache is an optimization; analysis keeps working without it
+            logger.warning(f"Probe cache unavailable at {self.db_path}: {str(e)}")
+            self._disabled = True
+            return None
+        self._conn = conn
+        self._pid = os.getpid()
+        return conn
+    
+    def get(self, media_path: str, file_size: int, file_mtime_ns: int) -> Optional[MediaFormat]:
+        """Return the stored analysis if the file is unchanged, otherwise None."""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(
+                    "SELECT data FROM probe WHERE path = ? AND size = ? AND mtime_ns = ?",
+                    (media_path, file_size, file_mtime_ns)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Probe cache read failed: {str(e)}")
+                return None
+        return MediaFormat.from_dict(_json_loads(row[0])) if row else None
+    
+    def put(self, media_path: str, file_size: int, file_mtime_ns: int, media_format: MediaFormat) -> None:
+        """Store an analysis, replacing any entry for an older version of the file."""
+        data = json.dumps(media_format.to_dict())
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO probe (path, size, mtime_ns, data) VALUES (?, ?, ?, ?)",
+                    (media_path, file_size, file_mtime_ns, data)
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Probe cache write failed: {str(e)}")
+
+
+@lru_cache(maxsize=None)
+def _get_probe_cache(db_path: str) -> _FFProbeCache:
+    """Return the shared cache object for a database path."""
+    return _FFProbeCache(db_path)
+
+
+@lru_cache(maxsize=256)
+def _ffprobe_cached(ffprobe_path: str,
+                    media_path: str,
+                    file_size: int,
+                    file_mtime_ns: int,
+                    cache_path: Optional[str] = None) -> MediaFormat:
+    """
+    Analyze a media file, consulting the persistent probe cache first.
+    
+    Size and modification time are only part of the cache key, so a file
+    that changes on disk is probed again instead of served from the cache.
+    
+    Args:
+        ffprobe_path: FFprobe executable
+        media_path: Path to media file
+        file_size: Size of the file in bytes
+        file_mtime_ns: Modification time of the file in nanoseconds
+        cache_path: SQLite database for results across runs, or None
+        
+    Returns:
+        MediaFormat object containing analysis results
+    """
+    store = _get_probe_cache(cache_path) if cache_path else None
+    if store is not None:
+        media_format = store.get(media_path, file_size, file_mtime_ns)
+        if media_format is not None:
+            return media_format
+    
+    media_format = _run_ffprobe(ffprobe_path, media_path, file_size)
+    if store is not None:
+        store.put(media_path, file_size, file_mtime_ns, media_format)
+    return media_format
+
+
+def _run_ffprobe(ffprobe_path: str, media_path: str, file_size: int) -> MediaFormat:
+    """
+    Run FFprobe on a media file and parse the result.
+    
+    Args:
+        ffprobe_path: FFprobe executable
+        media_path: Path to media file
+        file_size: Size of the file in bytes
+        
+    Returns:
+        MediaFormat object containing analysis results
+    """
+    logger.info(f"Analyzing media file: {media_path}")
+    
+    # Prepare FFprobe command for JSON output
+    cmd = [
+        ffprobe_path,
+        "-v", "quiet",
+        "-print_format", "json",
+        "-show_entries", _FFPROBE_ENTRIES,
+        media_path
+    ]
+    
+    try:
+        # Run FFprobe
+        # FFprobe is silenced with -v quiet, so stderr is discarded instead of buffered
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        # Parse the raw bytes directly; no intermediate decoded str is needed
+        data = _json_loads(result.stdout)
+        
+        # Extract format information
+        format_info = data.get("format", {})
+        streams = data.get("streams", [])
+        
+        # Initialize MediaFormat with default values
+        media_format = MediaFormat(file_size=file_size)
+        
+        # Extract container format
+        media_format.container = format_info.get("format_name", "")
+        
+        # Extract duration and bitrate
+        if "duration" in format_info:
+            media_format.duration = float(format_info["duration"])
+        if "bit_rate" in format_info:
+            media_format.bitrate = int(format_info["bit_rate"])
+        
+        # Find the video and audio streams
+        video_stream, audio_stream = _split_streams(streams)
+        
+        if video_stream:
+            media_format.video_codec = video_stream.get("codec_name", "")
+            media_format.width = video_stream.get("width", 0)
+            media_format.height = video_stream.get("height", 0)
+            
+            # Calculate frame rate
+            if "r_frame_rate" in video_stream:
+                media_format.frame_rate = _parse_rate(video_stream["r_frame_rate"])
+        
+        if audio_stream:
+            media_format.audio_codec = audio_stream.get("codec_name", "")
+        
+        return media_format
+        
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFprobe analysis failed: {str(e)}")
+        raise RuntimeError(f"Media analysis failed: {str(e)}")
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse FFprobe output: {str(e)}")
+        raise RuntimeError(f"Failed to parse media analysis output: {str(e)}")
+
+
 class MediaAnalyzer:
     """Analyzes media properties using FFprobe."""
     
-    def __init__(self):
+    def __init__(self, cache_path: Optional[str] = PROBE_CACHE_PATH):
+        """
+        Initialize the analyzer.
+        
+        Args:
+            cache_path: SQLite database that keeps results across runs; None
+                limits caching to the current process
+        """
         self.ffprobe_path = "ffprobe"  # Assumes ffprobe is in PATH
+        self.cache_path = cache_path
     
     def analyze(self, media_path: str, analysis_depth: str = "standard") -> MediaFormat:
         """
         Analyze media file and return format information.
         
+        Results are cached by path, size and modification time, in memory and
+        in the persistent probe cache, so an unchanged file isn't probed again.
+        
         Args:
             media_path: Path to media file
             analysis_depth: Level of analysis detail ('basic', 'standard', 'detailed')
@@ -238,71 +685,15 @@ class MediaAnalyzer:
         Returns:
             MediaFormat object containing analysis results
         """
-        logger.info(f"Analyzing media file: {media_path}")
-        
-        if not os.path.exists(media_path):
+        try:
+            st = os.stat(media_path)
+        except FileNotFoundError:
             raise FileNotFoundError(f"Media file not found: {media_path}")
         
-        # Get file size
-        file_size = os.path.getsize(media_path)
-        
-        # Prepare FFprobe command for JSON output
-        cmd = [
-            self.ffprobe_path,
-            "-v", "quiet",
-            "-print_format", "json",
-            "-show_format",
-            "-show_streams",
-            media_path
-        ]
-        
-        try:
-            # Run FFprobe
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            data = json.loads(result.stdout)
-            
-            # Extract format information
-            format_info = data.get("format", {})
-            streams = data.get("streams", [])
-            
-            # Initialize MediaFormat with default values
-            media_format = MediaFormat(file_size=file_size)
-            
-            # Extract container format
-            media_format.container = format_info.get("format_name", "")
-            
-            # Extract duration and bitrate
-            if "duration" in format_info:
-                media_format.duration = float(format_info["duration"])
-            if "bit_rate" in format_info:
-                media_format.bitrate = int(format_info["bit_rate"])
-            
-            # Process streams to find video and audio
-            for stream in streams:
-                codec_type = stream.get("codec_type", "")
-                
-                if codec_type == "video":
-                    media_format.video_codec = stream.get("codec_name", "")
-                    media_format.width = stream.get("width", 0)
-                    media_format.height = stream.get("height", 0)
-                    
-                    # Calculate frame rate
-                    if "r_frame_rate" in stream:
-                        fps_parts = stream["r_frame_rate"].split('/')
-                        if len(fps_parts) == 2 and int(fps_parts[1]) != 0:
-                            media_format.frame_rate = float(int(fps_parts[0]) / int(fps_parts[1]))
-                
-                elif codec_type == "audio":
-                    media_format.audio_codec = stream.get("codec_name", "")
-            
-            return media_format
-            
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFprobe analysis failed: {str(e)}")
-            raise RuntimeError(f"Media analysis failed: {str(e)}")
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse FFprobe output: {str(e)}")
-            raise RuntimeError(f"Failed to parse media analysis output: {str(e)}")
+        # Hand out a copy so callers can't modify the cached entry
+        return copy.copy(
+            _ffprobe_cached(self.ffprobe_path, media_path, st.st_size, st.st_mtime_ns, self.cache_path)
+        )
 
 
 class FormatNormalizer:
@@ -310,7 +701,8 @@ class FormatNormalizer:
     Main class for normalizing media formats using FFmpeg.
     """
     
-    def __init__(self, api_key: str = None, enable_drive: bool = False, drive_credentials: str = None):
+    def __init__(self, api_key: str = None, enable_drive: bool = False, drive_credentials: str = None,
+                 ffmpeg_threads: int = 0):
         """
         Initialize the normalizer.
         
@@ -318,11 +710,15 @@ class FormatNormalizer:
             api_key: API key for Gemini API
             enable_drive: Whether to enable Google Drive integration
             drive_credentials: Path to Google Drive API credentials file
+            ffmpeg_threads: Encoder threads per FFmpeg run (0 lets FFmpeg decide).
+                Low-bitrate encodes scale poorly past a few threads, so running
+                several jobs with a share of the cores each is usually faster.
         """
         self.api_key = api_key
         self.enable_drive = enable_drive
         self.drive_credentials = drive_credentials
         self.ffmpeg_path = "ffmpeg"  # Assumes ffmpeg is in PATH
+        self.ffmpeg_threads = ffmpeg_threads
         self.analyzer = MediaAnalyzer()
         
         # Optional: Initialize Google API clients if enabled
@@ -338,7 +734,8 @@ class FormatNormalizer:
                  preset: str = "standard",
                  custom_params: Dict[str, Any] = None,
                  preserve_metadata: bool = True,
-                 destination: str = None) -> NormalizationResult:
+                 destination: str = None,
+                 verify_output: bool = False) -> NormalizationResult:
         """
         Normalize a media file to the specified format.
         
@@ -349,23 +746,20 @@ class FormatNormalizer:
             custom_params: Custom FFmpeg parameters
             preserve_metadata: Whether to preserve metadata
             destination: Output destination path
+            verify_output: Probe the output with FFprobe instead of deriving
+                its format from the source and conversion parameters; always
+                done when custom_params is given
             
         Returns:
             NormalizationResult object with conversion results
         """
-        start_time = datetime.now()
-        job_id = f"norm_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        start_time = time.perf_counter()
+        job_id = _new_job_id("norm")
         logger.info(f"Starting normalization job {job_id} for {source}")
         
         # If destination not specified, create one
         if not destination:
-            source_dir = os.path.dirname(source)
-            file_name = os.path.basename(source)
-            base_name = os.path.splitext(file_name)[0]
-            destination = os.path.join(
-                source_dir, 
-                f"{base_name}_normalized.{output_format}"
-            )
+            destination = _compute_destination(source, output_format)
         
         # Analyze source media
         original_format = self.analyzer.analyze(source)
@@ -376,89 +770,293 @@ class FormatNormalizer:
             # Merge custom parameters with preset
             preset_params.update(custom_params)
         
-        # Prepare FFmpeg command
-        cmd = [self.ffmpeg_path, "-i", source]
-        
-        # Add parameters based on preset
-        for param, value in preset_params.items():
-            if param.startswith("_"):  # Skip internal parameters
-                continue
-                
-            if isinstance(value, bool):
-                if value:  # Only add flag if True
-                    cmd.append(f"-{param}")
-            else:
-                cmd.append(f"-{param}")
-                cmd.append(str(value))
-        
-        # Add metadata preservation if requested
-        if preserve_metadata:
-            cmd.append("-map_metadata")
-            cmd.append("0")
-        
-        # Add output path
-        cmd.append(destination)
+        # Unmodified presets reuse their pre-rendered arguments
+        param_args = None if custom_params else _PRESET_ARGS.get((output_format, preset), _DEFAULT_PRESET_ARGS)
+        cmd = self._build_command(source, preset_params, preserve_metadata, destination, param_args)
         
         # Execute FFmpeg command
         try:
             logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
             subprocess.run(cmd, check=True, capture_output=True)
             
-            # Analyze output file
-            normalized_format = self.analyzer.analyze(destination)
-            
-            # Calculate compression ratio
-            if original_format.file_size > 0 and normalized_format.file_size > 0:
-                compression_ratio = original_format.file_size / normalized_format.file_size
+            # Analyze output file when asked or when custom parameters (e.g. "vn", "r", "vf")
+            # make deriving it unreliable; otherwise derive it without another FFprobe run
+            if verify_output or custom_params:
+                normalized_format = self.analyzer.analyze(destination)
             else:
-                compression_ratio = 1.0
-            
-            # Calculate quality metrics (simplified - would be more sophisticated in real implementation)
-            # In a real implementation, this would use tools like VMAF, PSNR, SSIM
-            quality_metrics = {
-                "psnr": 40.0,  # Placeholder
-                "ssim": 0.95,  # Placeholder
-                "vmaf": 90.0   # Placeholder
-            }
+                normalized_format = self._derive_output_format(
+                    original_format, output_format, preset_params, destination
+                )
             
-            # Calculate processing time
-            processing_time = (datetime.now() - start_time).total_seconds()
+        except subprocess.CalledProcessError as e:
+            logger.error(f"FFmpeg processing failed: {e.stderr.decode() if e.stderr else str(e)}")
+            raise RuntimeError(f"Media normalization failed: {str(e)}")
+        
+        return self._build_result(
+            job_id, start_time, source, destination, original_format, normalized_format,
+            preset, custom_params, preserve_metadata
+        )
+    
+    async def normalize_batch(self,
+                              sources: List[str],
+                              output_format: str,
+                              preset: str = "standard",
+                              custom_params: Dict[str, Any] = None,
+                              preserve_metadata: bool = True,
+                              destination_folder: str = "",
+                              concurrency: int = 4) -> List[Union[NormalizationResult, Exception]]:
+        """
+        Normalize several files concurrently from a single event loop.
+        
+        Unlike BatchJob this doesn't start a worker process per job; each
+        conversion is an FFmpeg child awaited by a coroutine.
+        
+        Args:
+            sources: Paths to source media
+            output_format: Desired output format (e.g., "mp4", "wav")
+            preset: Predefined conversion settings (e.g., "web", "broadcast")
+            custom_params: Custom FFmpeg parameters
+            preserve_metadata: Whether to preserve metadata
+            destination_folder: Output folder; empty writes next to each source
+            concurrency: Maximum number of FFmpeg processes running at once
             
-            # Create result object
-            result = NormalizationResult(
-                job_id=job_id,
-                source=source,
-                destination=destination,
-                original_format=original_format,
-                normalized_format=normalized_format,
-                compression_ratio=compression_ratio,
-                quality_metrics=quality_metrics,
-                metadata_preserved=preserve_metadata,
-                processing_time=processing_time,
-                preset_used=preset,
-                custom_params=custom_params or {}
+        Returns:
+            Results in source order; a failed file yields its exception
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run(source: str) -> NormalizationResult:
+            async with semaphore:
+                return await self._normalize_async(
+                    source,
+                    output_format,
+                    preset,
+                    custom_params,
+                    preserve_metadata,
+                    _compute_destination(source, output_format, destination_folder)
+                )
+        
+        return await asyncio.gather(*(run(source) for source in sources), return_exceptions=True)
+    
+    async def _normalize_async(self,
+                               source: str,
+                               output_format: str,
+                               preset: str,
+                               custom_params: Optional[Dict[str, Any]],
+                               preserve_metadata: bool,
+                               destination: str) -> NormalizationResult:
+        """Async counterpart of normalize() used by normalize_batch()."""
+        start_time = time.perf_counter()
+        job_id = _new_job_id("norm")
+        logger.info(f"Starting normalization job {job_id} for {source}")
+        
+        loop = asyncio.get_running_loop()
+        
+        # FFprobe runs in a thread so other conversions keep progressing meanwhile
+        original_format = await loop.run_in_executor(None, self.analyzer.analyze, source)
+        
+        preset_params = self._get_preset(output_format, preset)
+        if custom_params:
+            preset_params.update(custom_params)
+        
+        param_args = None if custom_params else _PRESET_ARGS.get((output_format, preset), _DEFAULT_PRESET_ARGS)
+        cmd = self._build_command(source, preset_params, preserve_metadata, destination, param_args)
+        
+        try:
+            logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
             )
+            # Drain stderr while FFmpeg encodes so a full pipe can't stall it
+            try:
+                _, stderr = await proc.communicate()
+            except asyncio.CancelledError:
+                # Stop the encode instead of leaving FFmpeg writing a partial output
+                proc.kill()
+                await proc.wait()
+                raise
+            if proc.returncode != 0:
+                raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
             
-            logger.info(f"Normalization job {job_id} completed successfully")
-            return result
+            # Custom parameters can change the output in ways only FFprobe can tell
+            if custom_params:
+                normalized_format = await loop.run_in_executor(None, self.analyzer.analyze, destination)
+            else:
+                normalized_format = self._derive_output_format(
+                    original_format, output_format, preset_params, destination
+                )
             
         except subprocess.CalledProcessError as e:
             logger.error(f"FFmpeg processing failed: {e.stderr.decode() if e.stderr else str(e)}")
             raise RuntimeError(f"Media normalization failed: {str(e)}")
+        
+        return self._build_result(
+            job_id, start_time, source, destination, original_format, normalized_format,
+            preset, custom_params, preserve_metadata
+        )
+    
+    def _build_command(self,
+                       source: str,
+                       preset_params: Dict[str, Any],
+                       preserve_metadata: bool,
+                       destination: str,
+                       param_args: Optional[Tuple[str, ...]] = None) -> List[str]:
+        """
+        Build the FFmpeg argument list for a conversion.
+        
+        Args:
+            source: Path or URL to source media
+            preset_params: Preset parameters merged with any custom parameters
+            preserve_metadata: Whether to preserve metadata
+            destination: Output destination path
+            param_args: Pre-rendered arguments for preset_params, if available
+            
+        Returns:
+            FFmpeg command as an argument list
+        """
+        cmd = [self.ffmpeg_path, "-i", source]
+        
+        # Add parameters based on preset
+        if param_args is None:
+            param_args = _params_to_args(preset_params)
+        cmd.extend(param_args)
+        
+        # Cap encoder threads unless the preset or custom parameters already set them
+        if self.ffmpeg_threads and "threads" not in preset_params:
+            cmd.extend(["-threads", str(self.ffmpeg_threads)])
+        
+        # Add metadata preservation if requested
+        if preserve_metadata:
+            cmd.append("-map_metadata")
+            cmd.append("0")
+        
+        # Add output path
+        cmd.append(destination)
+        return cmd
+    
+    def _build_result(self,
+                      job_id: str,
+                      start_time: float,
+                      source: str,
+                      destination: str,
+                      original_format: MediaFormat,
+                      normalized_format: MediaFormat,
+                      preset: str,
+                      custom_params: Optional[Dict[str, Any]],
+                      preserve_metadata: bool) -> NormalizationResult:
+        """Assemble the NormalizationResult for a finished conversion."""
+        # Calculate compression ratio
+        if original_format.file_size > 0 and normalized_format.file_size > 0:
+            compression_ratio = original_format.file_size / normalized_format.file_size
+        else:
+            compression_ratio = 1.0
+        
+        # Calculate quality metrics (simplified - would be more sophisticated in real implementation)
+        # In a real implementation, this would use tools like VMAF, PSNR, SSIM
+        quality_metrics = {
+            "psnr": 40.0,  # Placeholder
+            "ssim": 0.95,  # Placeholder
+            "vmaf": 90.0   # Placeholder
+        }
+        
+        # Calculate processing time
+        processing_time = time.perf_counter() - start_time
+        
+        # Create result object
+        result = NormalizationResult(
+            job_id=job_id,
+            source=source,
+            destination=destination,
+            original_format=original_format,
+            normalized_format=normalized_format,
+            compression_ratio=compression_ratio,
+            quality_metrics=quality_metrics,
+            metadata_preserved=preserve_metadata,
+            processing_time=processing_time,
+            preset_used=preset,
+            custom_params=custom_params or {}
+        )
+        
+        logger.info(f"Normalization job {job_id} completed successfully")
+        return result
+    
+    def _derive_output_format(self,
+                              original_format: MediaFormat,
+                              output_format: str,
+                              params: Dict[str, Any],
+                              destination: str) -> MediaFormat:
+        """
+        Describe a converted file from its source format and conversion parameters.
+        
+        Only meant for the built-in presets; custom parameters need the output probed.
+        
+        Args:
+            original_format: Format of the source media
+            output_format: Output container format
+            params: Parameters the conversion ran with
+            destination: Path of the converted file
+            
+        Returns:
+            MediaFormat object for the converted file
+        """
+        file_size = os.stat(destination).st_size
+        
+        # Output streams exist only for source streams; "copy" keeps the source codec. The
+        # built-in presets only omit a codec for audio-only containers, which drop the video
+        # (otherwise FFmpeg would pick the container's default encoder)
+        video_codec = params.get("c:v", "") if original_format.video_codec else ""
+        if video_codec == "copy":
+            video_codec = original_format.video_codec
+        else:
+            video_codec = _ENCODER_CODECS.get(video_codec, video_codec)
+        audio_codec = params.get("c:a", "") if original_format.audio_codec else ""
+        if audio_codec == "copy":
+            audio_codec = original_format.audio_codec
+        else:
+            audio_codec = _ENCODER_CODECS.get(audio_codec, audio_codec)
+        
+        width = height = 0
+        frame_rate = 0
+        if video_codec:
+            width, height = original_format.width, original_format.height
+            frame_rate = original_format.frame_rate
+            # An explicit output size such as "1280x720" overrides the source dimensions
+            size = str(params.get("s", ""))
+            if "x" in size:
+                w, _, h = size.partition("x")
+                if w.isdigit() and h.isdigit():
+                    width, height = int(w), int(h)
+        
+        duration = original_format.duration
+        bitrate = int(file_size * 8 / duration) if duration > 0 else 0
+        
+        return MediaFormat(
+            container=_PROBE_CONTAINERS.get(output_format, output_format),
+            video_codec=video_codec,
+            audio_codec=audio_codec,
+            width=width,
+            height=height,
+            frame_rate=frame_rate,
+            duration=duration,
+            bitrate=bitrate,
+            file_size=file_size
+        )
     
     def create_batch_job(self,
                         media_sources: List[str],
                         output_format: str,
                         preset: str = "standard",
                         preserve_metadata: bool = True,
-                        destination_folder: str = "") -> BatchJob:
+                        destination_folder: str = "",
+                        parallelization: int = None) -> BatchJob:
         """Create a batch job for processing multiple files."""
         return BatchJob(
             media_sources=media_sources,
             output_format=output_format,
             preset=preset,
             preserve_metadata=preserve_metadata,
-            destination_folder=destination_folder
+            destination_folder=destination_folder,
+            parallelization=parallelization
         )
     
     def normalize_drive_folder(self,
@@ -501,85 +1099,19 @@ class FormatNormalizer:
         
         In a real implementation, this would load from a database or config file.
         """
-        # Default presets
-        presets = {
-            "mp4": {
-                "web": {
-                    "c:v": "libx264",
-                    "c:a": "aac",
-                    "b:v": "2M",
-                    "b:a": "128k",
-                    "preset": "medium",
-                    "profile:v": "high",
-                    "pix_fmt": "yuv420p"
-                },
-                "broadcast": {
-                    "c:v": "libx264",
-                    "c:a": "aac",
-                    "b:v": "8M",
-                    "b:a": "384k",
-                    "preset": "slow",
-                    "profile:v": "high"
-                },
-                "archive": {
-                    "c:v": "libx265",
-                    "c:a": "aac",
-                    "crf": "18",
-                    "preset": "slow",
-                    "pix_fmt": "yuv420p10le"
-                }
-            },
-            "mov": {
-                "broadcast": {
-                    "c:v": "prores_ks",
-                    "profile:v": "3",
-                    "vendor": "apl0",
-                    "c:a": "pcm_s24le"
-                }
-            },
-            "wav": {
-                "standard": {
-                    "c:a": "pcm_s24le",
-                    "ar": "48000",
-                    "ac": "2"
-                }
-            },
-            "mp3": {
-                "web": {
-                    "c:a": "libmp3lame",
-                    "b:a": "192k",
-                    "ar": "44100"
-                }
-            }
-        }
-        
-        # Use "standard" as default preset if the requested preset doesn't exist
-        if format_type not in presets or preset_name not in presets[format_type]:
-            logger.warning(f"Preset {preset_name} for format {format_type} not found, using defaults")
-            return {"c:v": "copy", "c:a": "copy"}
-        
-        return presets[format_type][preset_name]
+        return _lookup_preset(format_type, preset_name)
 
 
 # Helper functions for presets
 def get_preset(format_type: str, preset_name: str) -> Dict[str, Any]:
     """Get a preset by format and name."""
-    normalizer = FormatNormalizer()
-    return normalizer._get_preset(format_type, preset_name)
+    return _lookup_preset(format_type, preset_name)
 
 def list_presets(format_type: str = None) -> Dict[str, List[str]]:
     """List available presets, optionally filtered by format type."""
-    # Simplified implementation - would be more robust in real code
-    presets = {
-        "mp4": ["web", "broadcast", "archive"],
-        "mov": ["broadcast"],
-        "wav": ["standard"],
-        "mp3": ["web"]
-    }
-    
     if format_type:
-        return {format_type: presets.get(format_type, [])}
-    return presets
+        return {format_type: list(_PRESETS.get(format_type, {}))}
+    return {name: list(presets) for name, presets in _PRESETS.items()}
 
 def add_preset(format_type: str, preset_name: str, params: Dict[str, Any]) -> bool:
     """Add or update a preset."""
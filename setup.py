@@ -27,10 +27,13 @@ setup(
         "pyyaml>=6.0.0",
         "asyncio>=3.4.3",
         "aiohttp>=3.8.4",
+        "aiofiles>=0.7.0",
         "requests>=2.28.2",
-        "google-cloud-storage>=2.7.0",
+        "google-cloud-storage>=2.10.0",
+        "gcloud-aio-storage>=8.0.0",
         "google-cloud-firestore>=2.9.1",
-        "google-generativeai>=0.3.0"
+        "google-generativeai>=0.5.0",
+        "aiosqlite>=0.17.0"
     ],
     entry_points={
         "console_scripts": [
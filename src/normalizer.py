@@ -27,6 +27,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Outputs below this size can be handed back in memory instead of by path
+IN_MEMORY_OUTPUT_LIMIT = 50 * 1024 * 1024
+
 class FormatNormalizer:
     """
     Main class for media format normalization operations.
@@ -230,7 +233,8 @@ class FormatNormalizer:
                  codec: Optional[str] = None,
                  preset: Optional[str] = None,
                  output_path: Optional[str] = None,
-                 options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                 options: Optional[Dict[str, Any]] = None,
+                 return_bytes: bool = False) -> Dict[str, Any]:
         """
         Normalize a media file to the specified format.
         
@@ -241,6 +245,9 @@ class FormatNormalizer:
             preset: Quality preset (e.g., "web", "broadcast")
             output_path: Custom output path
             options: Additional options for the normalization process
+            return_bytes: Return small outputs as bytes under "data" and remove
+                the output file instead of leaving it on disk; the result then
+                carries the output file name under "filename" instead of "uri"
             
         Returns:
             Dictionary with normalization results and metadata
@@ -349,7 +356,7 @@ class FormatNormalizer:
             }
             
             # Step 10: Return results
-            return {
+            result = {
                 "success": True,
                 "job_id": job_id,
                 "result": {
@@ -369,6 +376,17 @@ class FormatNormalizer:
                 "validation": validation_result
             }
             
+            # Hand small outputs back in memory so callers can skip re-reading them
+            if return_bytes and output_info.get("size", IN_MEMORY_OUTPUT_LIMIT) < IN_MEMORY_OUTPUT_LIMIT:
+                with open(output_path, 'rb') as f:
+                    result["data"] = f.read()
+                os.remove(output_path)
+                # The local path no longer exists; keep only the name for storing the bytes
+                del result["result"]["uri"]
+                result["result"]["filename"] = os.path.basename(output_path)
+            
+            return result
+            
         except Exception as e:
             logger.error(f"Error during normalization: {e}")
             return {